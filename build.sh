@@ -79,15 +79,12 @@ else
     echo -e "${GREEN}Using PostgreSQL database at: ${DATABASE_URL}${NC}"
 fi
 
-# Initialize the database
+# Initialize the database (creates tables and seeds the default admin, config and blacklist)
 echo -e "${GREEN}Initializing database...${NC}"
-$PYTHON_CMD -c "from app import app, db; from models import User, Config; app.app_context().push(); db.create_all(); Config.query.first() or db.session.add(Config(shutdown_threshold=14, monitoring_interval=5)) and db.session.commit(); print('Database initialized successfully');"
+INIT_OUTPUT=$($PYTHON_CMD -m flask --app app init-db)
+echo -e "${GREEN}${INIT_OUTPUT}${NC}"
 
-# Check if admin user exists, if not create it
-echo -e "${GREEN}Checking for admin user...${NC}"
-ADMIN_EXISTS=$($PYTHON_CMD -c "from app import app, db; from models import User; from werkzeug.security import generate_password_hash; app.app_context().push(); admin = User.query.filter_by(username='admin').first(); created = False; if not admin: admin = User(username='admin', password_hash=generate_password_hash('admin'), is_admin=True); db.session.add(admin); db.session.commit(); created = True; print('created' if created else 'exists');")
-
-if [ "$ADMIN_EXISTS" == "created" ]; then
+if [[ "$INIT_OUTPUT" == *"Created default admin user"* ]]; then
     echo -e "${GREEN}Admin user created with default credentials:${NC}"
     echo -e "${GREEN}Username: admin${NC}"
     echo -e "${GREEN}Password: admin${NC}"
@@ -0,0 +1,25 @@
+import logging
+import os
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Kept free of app imports so gunicorn.conf.py can use it in the master
+TRUE_VALUES = ("1", "true", "yes", "on")
+FALSE_VALUES = ("0", "false", "no", "off")
+
+
+def env_flag(name, default):
+    """Read an on/off environment variable.
+
+    Accepts 1/true/yes/on and 0/false/no/off in any case. Unset or empty
+    gives `default`; anything else logs a warning and gives `default` too.
+    """
+    value = os.environ.get(name, "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    if value:
+        logger.warning(f"Unknown {name} value {value!r}, using {'on' if default else 'off'}")
+    return default
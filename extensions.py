@@ -0,0 +1,13 @@
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+# Extensions are created unbound here and attached to the app in create_app(),
+# so models and utilities can import them without importing the app itself.
+class Base(DeclarativeBase):
+    pass
+
+db = SQLAlchemy(model_class=Base)
+
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
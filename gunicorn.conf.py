@@ -0,0 +1,112 @@
+"""Gunicorn settings for Agnoster.
+
+Gunicorn loads this file automatically when started from the project
+directory, so `gunicorn main:app` picks it up. Command line flags still win.
+
+Set AGNOSTER_ASYNC=1 to serve with gevent workers. Each worker then handles
+many connections as greenlets, and kubectl subprocess waits yield to other
+requests instead of pinning the worker, so a few processes can serve
+thousands of concurrent dashboard pollers.
+
+Database calls must yield too, or one slow query stalls every connection
+of its worker. With PostgreSQL, each worker patches psycopg2 with
+psycogreen after it forks (see post_fork); gunicorn refuses to start in
+async mode when psycogreen is missing. sqlite3 cannot be made cooperative,
+so async mode should run against PostgreSQL; SQLite still works, but each
+query blocks its worker while it runs.
+
+In async mode the monitor also moves out of the workers into a process of
+its own (see on_starting), so parsing cluster listings and writing history
+never compete with requests for a worker's event loop. Set
+AGNOSTER_MONITOR=0 to run no monitor at all.
+
+The master runs the database init step once at startup (see on_starting),
+so workers never create tables or seed data themselves.
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+
+from env_utils import env_flag
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+ASYNC = env_flag("AGNOSTER_ASYNC", False)
+USES_POSTGRES = os.environ.get("DATABASE_URL", "").startswith(("postgres://", "postgresql"))
+# The monitor runs in its own process in async mode, unless it is turned off
+MONITOR_PROCESS = ASYNC and env_flag("AGNOSTER_MONITOR", True)
+MONITOR_RESTART_DELAY = 30  # Seconds before a monitor process that exited is started again
+
+if ASYNC:
+    # gevent patches the standard library (subprocess, threading, sockets)
+    # when the worker boots, so the app must not be preloaded in the master.
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("AGNOSTER_WORKER_CONNECTIONS", "1000"))
+    preload_app = False
+
+    if USES_POSTGRES and importlib.util.find_spec("psycogreen") is None:
+        raise RuntimeError("AGNOSTER_ASYNC with PostgreSQL needs psycogreen; "
+                           "install it or unset AGNOSTER_ASYNC")
+
+    if MONITOR_PROCESS:
+        # Inherited by the workers, which then leave the monitor to that process
+        os.environ["AGNOSTER_MONITOR"] = "0"
+
+# kubectl calls against a busy API server can take several seconds
+timeout = int(os.environ.get("AGNOSTER_WORKER_TIMEOUT", "60"))
+
+_monitor = None
+_stopping = threading.Event()
+
+
+def _supervise_monitor(server):
+    """Run `flask --app app run-monitor`, starting it again if it exits."""
+    global _monitor
+    while not _stopping.is_set():
+        _monitor = subprocess.Popen([sys.executable, "-m", "flask", "--app", "app", "run-monitor"])
+        server.log.info(f"Started monitor process {_monitor.pid}")
+        returncode = _monitor.wait()
+        if _stopping.is_set():
+            return
+        server.log.warning(f"Monitor process exited with code {returncode}; "
+                           f"restarting in {MONITOR_RESTART_DELAY}s")
+        _stopping.wait(MONITOR_RESTART_DELAY)
+
+
+def on_starting(server):
+    """Create tables and seed defaults once, before any worker boots.
+
+    Runs in a separate process so the master never imports the app (gevent
+    workers must patch the standard library before it is loaded). Failures
+    are logged rather than fatal; workers still boot and /healthz reports
+    the database as unavailable until `flask --app app init-db` succeeds.
+
+    In async mode this then starts the monitor process.
+    """
+    result = subprocess.run([sys.executable, "-m", "flask", "--app", "app", "init-db"])
+    if result.returncode != 0:
+        server.log.warning("Database initialization failed; run `flask --app app init-db`")
+
+    if MONITOR_PROCESS:
+        threading.Thread(target=_supervise_monitor, args=(server,), daemon=True).start()
+
+
+def post_fork(server, worker):
+    """Make psycopg2 wait on gevent instead of blocking the whole worker."""
+    if ASYNC and USES_POSTGRES:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.debug(f"Patched psycopg2 for gevent in worker {worker.pid}")
+
+
+def on_exit(server):
+    """Stop the monitor process together with the master."""
+    _stopping.set()
+    if _monitor is not None and _monitor.poll() is None:
+        _monitor.terminate()
+        try:
+            _monitor.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _monitor.kill()
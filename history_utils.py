@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import case, func
+from models import NamespaceBlacklist, NamespaceLog, NamespaceMetric
+from extensions import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+# Rollup tiers: bucket width -> how long buckets are kept (seconds).
+# Storage stays bounded at roughly namespaces x (2880 + 2160 + 730) rows.
+RETENTION = {
+    MINUTE: 2 * DAY,
+    HOUR: 90 * DAY,
+    DAY: 730 * DAY,
+}
+RESOLUTIONS = {"1m": MINUTE, "1h": HOUR, "1d": DAY}
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Namespaces stopped by the monitor -> (pod count at shutdown, stopped at).
+# While they stay at zero pods every tick credits the pod-hours they would
+# have used. The entry is dropped once pods show up again, the namespace is
+# started, reset, destroyed or blacklisted, or SAVINGS_MAX_AGE has passed.
+SAVINGS_MAX_AGE = 7 * DAY
+# Actions after which a stopped namespace no longer counts as saving pods
+ENDS_SAVINGS = ("start", "destroy", "reset")
+
+_stopped = {}
+_stopped_restored = False
+_stopped_lock = threading.Lock()
+
+
+def _insert():
+    """Return the dialect-specific INSERT construct that supports upserts."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"History upserts are not supported on {dialect}")
+    return insert
+
+
+def _greatest(current, new):
+    return case((new > current, new), else_=current)
+
+
+def _restore_stopped(now):
+    """Rebuild the stopped namespaces after a restart from the hourly shutdown counts."""
+    rows = NamespaceMetric.query.filter(
+        NamespaceMetric.resolution == HOUR,
+        NamespaceMetric.shutdowns > 0,
+        NamespaceMetric.bucket >= now - SAVINGS_MAX_AGE
+    ).order_by(NamespaceMetric.bucket).all()
+    # Later buckets overwrite earlier ones, leaving each namespace's last shutdown
+    for row in rows:
+        _stopped[row.namespace_name] = (row.pod_count_max, row.bucket)
+
+
+def _expire_stopped(now):
+    """Drop stopped namespaces that should no longer be credited with savings."""
+    for namespace, (pods, stopped_at) in list(_stopped.items()):
+        if stopped_at < now - SAVINGS_MAX_AGE:
+            del _stopped[namespace]
+    if not _stopped:
+        return
+
+    blacklisted = {entry.namespace_name for entry in NamespaceBlacklist.query.all()}
+    earliest = datetime.utcfromtimestamp(min(stopped_at for _, stopped_at in _stopped.values()))
+    later_actions = NamespaceLog.query.filter(
+        NamespaceLog.namespace_name.in_(list(_stopped)),
+        NamespaceLog.action.in_(ENDS_SAVINGS),
+        NamespaceLog.timestamp >= earliest
+    ).all()
+    ended = {
+        entry.namespace_name for entry in later_actions
+        if entry.timestamp >= datetime.utcfromtimestamp(_stopped[entry.namespace_name][1])
+    }
+    for namespace in blacklisted | ended:
+        _stopped.pop(namespace, None)
+
+
+def record_tick(namespace_stats, threshold_hours, interval_hours, stopped=None, now=None):
+    """Fold one monitor tick into every rollup tier.
+
+    namespace_stats maps namespace name -> {"pod_count": int, "max_runtime": float}.
+    stopped maps the namespaces shut down during this tick to their pod count.
+    """
+    global _stopped_restored
+    now = int(now if now is not None else time.time())
+    stopped = stopped or {}
+
+    with _stopped_lock:
+        if not _stopped_restored:
+            _restore_stopped(now)
+            _stopped_restored = True
+        _expire_stopped(now)
+        saved = {}
+        for namespace, (pods, stopped_at) in list(_stopped.items()):
+            if namespace_stats.get(namespace, {}).get("pod_count", 0) > 0:
+                del _stopped[namespace]
+            else:
+                saved[namespace] = pods * interval_hours
+        _stopped.update({namespace: (pods, now) for namespace, pods in stopped.items()})
+
+    names = set(namespace_stats) | set(saved) | set(stopped)
+    if not names:
+        return
+
+    rows = []
+    for resolution in RETENTION:
+        bucket = now - now % resolution
+        for namespace in names:
+            stats = namespace_stats.get(namespace, {})
+            pod_count = stats.get("pod_count", 0)
+            max_runtime = stats.get("max_runtime", 0)
+            rows.append({
+                "resolution": resolution,
+                "bucket": bucket,
+                "namespace_name": namespace,
+                "samples": 1,
+                "pod_count_sum": pod_count,
+                "pod_count_max": pod_count,
+                "max_runtime_hours": max_runtime,
+                "over_threshold_samples": 1 if max_runtime > threshold_hours else 0,
+                "shutdowns": 1 if namespace in stopped else 0,
+                "pod_hours_saved": saved.get(namespace, 0),
+            })
+
+    table = NamespaceMetric.__table__
+    stmt = _insert()(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["resolution", "namespace_name", "bucket"],
+        set_={
+            "samples": table.c.samples + stmt.excluded.samples,
+            "pod_count_sum": table.c.pod_count_sum + stmt.excluded.pod_count_sum,
+            "pod_count_max": _greatest(table.c.pod_count_max, stmt.excluded.pod_count_max),
+            "max_runtime_hours": _greatest(table.c.max_runtime_hours, stmt.excluded.max_runtime_hours),
+            "over_threshold_samples": table.c.over_threshold_samples + stmt.excluded.over_threshold_samples,
+            "shutdowns": table.c.shutdowns + stmt.excluded.shutdowns,
+            "pod_hours_saved": table.c.pod_hours_saved + stmt.excluded.pod_hours_saved,
+        }
+    )
+    db.session.execute(stmt, rows)
+
+    # Drop buckets that fell out of their tier's retention window
+    for resolution, retention in RETENTION.items():
+        NamespaceMetric.query.filter(
+            NamespaceMetric.resolution == resolution,
+            NamespaceMetric.bucket < now - retention
+        ).delete(synchronize_session=False)
+
+    db.session.commit()
+    logger.debug(f"Recorded history for {len(names)} namespaces")
+
+
+def runtimes_at(timestamp):
+    """Approximate each namespace's pod runtimes at a past moment.
+
+    Uses the finest tier that still covers the timestamp. Only the max runtime
+    and average pod count are kept per bucket, so every pod is assumed to be
+    as old as the namespace's longest-running one. Returns the bucket start and
+    a namespace -> runtimes mapping, or (None, {}) when nothing was recorded.
+    """
+    for resolution in sorted(RETENTION):
+        bucket = timestamp - timestamp % resolution
+        rows = NamespaceMetric.query.filter_by(resolution=resolution, bucket=bucket).all()
+        if rows:
+            return bucket, {
+                row.namespace_name: [row.max_runtime_hours] * round(row.pod_count_sum / row.samples)
+                for row in rows
+            }
+    return None, {}
+
+
+def pick_resolution(start, end, now=None):
+    """Choose the coarsest tier that still gives a useful number of points.
+
+    Tiers whose retention no longer reaches back to start are skipped, since
+    their buckets for that period were already pruned.
+    """
+    now = now if now is not None else time.time()
+    span = end - start
+    if span <= 6 * HOUR:
+        resolution = MINUTE
+    elif span <= 14 * DAY:
+        resolution = HOUR
+    else:
+        resolution = DAY
+
+    for candidate in sorted(RETENTION):
+        if candidate >= resolution and now - RETENTION[candidate] <= start:
+            return candidate
+    return max(RETENTION)
+
+
+def query_history(start, end, resolution=None, namespace=None):
+    """Return per-bucket aggregates between two Unix timestamps.
+
+    Reads a single rollup tier, so the cost depends on the number of buckets
+    in the range rather than on how many monitor ticks were recorded.
+    """
+    resolution = resolution or pick_resolution(start, end)
+    if resolution not in RETENTION:
+        raise ValueError(f"Unsupported resolution: {resolution}")
+
+    filters = [
+        NamespaceMetric.resolution == resolution,
+        NamespaceMetric.bucket >= start - start % resolution,
+        NamespaceMetric.bucket < end,
+    ]
+    if namespace:
+        filters.append(NamespaceMetric.namespace_name == namespace)
+
+    is_over = case((NamespaceMetric.over_threshold_samples > 0, 1), else_=0)
+    rows = db.session.query(
+        NamespaceMetric.bucket,
+        func.count(NamespaceMetric.id),
+        func.sum(is_over),
+        func.sum(NamespaceMetric.pod_count_sum * 1.0 / NamespaceMetric.samples),
+        func.max(NamespaceMetric.pod_count_max),
+        func.max(NamespaceMetric.max_runtime_hours),
+        func.sum(NamespaceMetric.shutdowns),
+        func.sum(NamespaceMetric.pod_hours_saved),
+    ).filter(*filters).group_by(NamespaceMetric.bucket).order_by(NamespaceMetric.bucket).all()
+
+    data = [{
+        "bucket": datetime.utcfromtimestamp(bucket).strftime(TIME_FORMAT),
+        "namespaces": namespaces,
+        "namespaces_over_threshold": over or 0,
+        "avg_pods": round(avg_pods or 0, 2),
+        "max_pods": max_pods or 0,
+        "max_runtime_hours": round(max_runtime or 0, 2),
+        "shutdowns": shutdowns or 0,
+        "pod_hours_saved": round(saved or 0, 2),
+    } for bucket, namespaces, over, avg_pods, max_pods, max_runtime, shutdowns, saved in rows]
+
+    over_namespaces = db.session.query(
+        func.count(func.distinct(NamespaceMetric.namespace_name))
+    ).filter(*filters, NamespaceMetric.over_threshold_samples > 0).scalar()
+
+    return {
+        "resolution": next(name for name, seconds in RESOLUTIONS.items() if seconds == resolution),
+        "start": datetime.utcfromtimestamp(start).strftime(TIME_FORMAT),
+        "end": datetime.utcfromtimestamp(end).strftime(TIME_FORMAT),
+        "data": data,
+        "totals": {
+            "namespaces_over_threshold": over_namespaces or 0,
+            "shutdowns": sum(point["shutdowns"] for point in data),
+            "pod_hours_saved": round(sum(point["pod_hours_saved"] for point in data), 2),
+        }
+    }
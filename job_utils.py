@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from models import Job
+from extensions import db
+from kubernetes_utils import (
+    start_namespace, stop_namespace,
+    destroy_namespace, reset_namespace, READINESS_TIMEOUT
+)
+from snapshot_utils import snapshots
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Worker threads per process; 0 leaves jobs for other processes to run
+JOB_WORKERS = int(os.environ.get("AGNOSTER_JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = 5  # Seconds between checks for jobs queued by other processes
+JOB_LEASE = 60  # Seconds a running job stays claimed without a heartbeat
+JOB_MAX_ATTEMPTS = 3
+JOB_RETENTION = timedelta(days=7)
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class JobConflictError(Exception):
+    """Raised when a namespace already has an active job for another action."""
+
+    def __init__(self, job):
+        super().__init__(f"Namespace {job.namespace_name} already has a {job.action} job {job.status}")
+        self.job = job
+
+
+def _start(namespace, params, user_id):
+    return start_namespace(
+        namespace,
+        wait=params.get("wait", False),
+        timeout=params.get("timeout", READINESS_TIMEOUT),
+        user_id=user_id
+    )
+
+
+def _stop(namespace, params, user_id):
+    return stop_namespace(namespace, automated=params.get("automated", False), user_id=user_id)
+
+
+def _destroy(namespace, params, user_id):
+    destroy_namespace(namespace, user_id=user_id)
+    return {}
+
+
+def _reset(namespace, params, user_id):
+    reset_namespace(namespace, user_id=user_id)
+    return {}
+
+
+# Action name -> handler(namespace, params, user_id) returning a JSON-able result
+JOB_ACTIONS = {
+    "start": _start,
+    "stop": _stop,
+    "destroy": _destroy,
+    "reset": _reset,
+}
+
+# Wakes this process's idle workers when a job is queued here
+_wake = threading.Event()
+# Ids of the jobs this process is running, kept alive by the heartbeat thread
+_running = set()
+_running_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+def _format(value):
+    return value.strftime(TIME_FORMAT) if value else None
+
+
+def describe_job(job):
+    """Return the API representation of a job."""
+    return {
+        "id": job.id,
+        "action": job.action,
+        "namespace": job.namespace_name,
+        "status": job.status,
+        "params": json.loads(job.params) if job.params else {},
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": _format(job.created_at),
+        "started_at": _format(job.started_at),
+        "finished_at": _format(job.finished_at),
+    }
+
+
+def enqueue(action, namespace, params=None, user_id=None):
+    """Queue an action for a namespace and return (job, created).
+
+    A namespace has at most one queued or running job. Asking for the same
+    action again returns that job instead of queueing a duplicate; asking for
+    a different action raises JobConflictError until it has finished.
+    """
+    if action not in JOB_ACTIONS:
+        raise ValueError(f"Unknown job action: {action}")
+
+    for _ in range(2):
+        job = Job(
+            id=uuid.uuid4().hex,
+            action=action,
+            namespace_name=namespace,
+            active_namespace=namespace,
+            params=json.dumps(params or {}),
+            user_id=user_id
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = Job.query.filter_by(active_namespace=namespace).first()
+            if existing is None:
+                # The active job finished in the meantime; try again
+                continue
+            if existing.action != action:
+                raise JobConflictError(existing)
+            logger.info(f"Reusing {existing.status} {action} job {existing.id} for namespace {namespace}")
+            return existing, False
+
+        logger.info(f"Queued {action} job {job.id} for namespace {namespace}")
+        _wake.set()
+        return job, True
+
+    raise RuntimeError(f"Could not queue {action} job for namespace {namespace}")
+
+
+def run_now(action, namespace, params=None, user_id=None):
+    """Run an action in the calling thread as a job and return its result.
+
+    The job takes the namespace's active-job slot like a queued one, so it
+    never runs alongside another job for the same namespace: if one is
+    queued or running, JobConflictError is raised and nothing is done.
+    Errors from the action are recorded on the job and raised again.
+    """
+    if action not in JOB_ACTIONS:
+        raise ValueError(f"Unknown job action: {action}")
+    _ensure_heartbeat(current_app._get_current_object())
+
+    for _ in range(2):
+        now = datetime.utcnow()
+        job = Job(
+            id=uuid.uuid4().hex,
+            action=action,
+            namespace_name=namespace,
+            active_namespace=namespace,
+            params=json.dumps(params or {}),
+            user_id=user_id,
+            status="running",
+            attempts=1,
+            started_at=now,
+            lease_expires=now + timedelta(seconds=JOB_LEASE)
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = Job.query.filter_by(active_namespace=namespace).first()
+            if existing is None:
+                continue
+            raise JobConflictError(existing)
+        return _execute(job)
+
+    raise RuntimeError(f"Could not run {action} job for namespace {namespace}")
+
+
+def _claim_next():
+    """Claim the oldest runnable job, or return None when there is nothing to do.
+
+    Runnable means queued, or running under a lease that expired because the
+    process running it died. The claim is a conditional UPDATE, so several
+    workers and processes can poll the same table safely.
+    """
+    now = datetime.utcnow()
+    job = Job.query.filter(or_(
+        Job.status == "queued",
+        and_(Job.status == "running", Job.lease_expires < now)
+    )).order_by(Job.created_at).first()
+    if job is None:
+        return None
+
+    if job.status == "running" and job.attempts >= JOB_MAX_ATTEMPTS:
+        _finish(job.id, "failed", error="Job was interrupted too many times")
+        return _claim_next()
+
+    claimed = Job.query.filter_by(
+        id=job.id, status=job.status, lease_expires=job.lease_expires
+    ).update({
+        Job.status: "running",
+        Job.attempts: Job.attempts + 1,
+        Job.started_at: now,
+        Job.lease_expires: now + timedelta(seconds=JOB_LEASE),
+    }, synchronize_session=False)
+    db.session.commit()
+
+    if not claimed:
+        # Another worker got there first
+        return _claim_next()
+
+    db.session.refresh(job)
+    if job.attempts > 1:
+        logger.warning(f"Resuming {job.action} job {job.id} for namespace {job.namespace_name} "
+                       f"(attempt {job.attempts})")
+    return job
+
+
+def _finish(job_id, status, result=None, error=None):
+    now = datetime.utcnow()
+    Job.query.filter_by(id=job_id).update({
+        Job.status: status,
+        Job.result: json.dumps(result) if result is not None else None,
+        Job.error: error,
+        Job.finished_at: now,
+        Job.active_namespace: None,
+        Job.lease_expires: None,
+    }, synchronize_session=False)
+    Job.query.filter(
+        Job.status.in_(("succeeded", "failed")),
+        Job.finished_at < now - JOB_RETENTION
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _execute(job):
+    """Run a claimed job, record how it ended and return its result or raise."""
+    handler = JOB_ACTIONS.get(job.action)
+    with _running_lock:
+        _running.add(job.id)
+
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job action: {job.action}")
+        result = handler(job.namespace_name, json.loads(job.params or "{}"), job.user_id)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"{job.action} job {job.id} for namespace {job.namespace_name} failed: {str(e)}")
+        _finish(job.id, "failed", error=str(e))
+        raise
+    else:
+        logger.info(f"{job.action} job {job.id} for namespace {job.namespace_name} succeeded")
+        _finish(job.id, "succeeded", result=result)
+    finally:
+        with _running_lock:
+            _running.discard(job.id)
+        # The namespace changed; don't serve cached listings from before the job
+        snapshots.invalidate()
+    return result
+
+
+def _run(job):
+    try:
+        _execute(job)
+    except Exception:
+        # Already logged and recorded on the job
+        pass
+
+
+def _worker(app):
+    with app.app_context():
+        while True:
+            try:
+                job = _claim_next()
+                if job is None:
+                    _wake.wait(JOB_POLL_INTERVAL)
+                    _wake.clear()
+                    continue
+                _run(job)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error in job worker: {str(e)}")
+                _wake.wait(JOB_POLL_INTERVAL)
+            finally:
+                db.session.close()
+
+
+def _heartbeat(app):
+    """Extend the leases of the jobs running in this process."""
+    with app.app_context():
+        while True:
+            time.sleep(JOB_LEASE / 3)
+            with _running_lock:
+                job_ids = list(_running)
+            if not job_ids:
+                continue
+            try:
+                Job.query.filter(Job.id.in_(job_ids), Job.status == "running").update({
+                    Job.lease_expires: datetime.utcnow() + timedelta(seconds=JOB_LEASE)
+                }, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error extending job leases: {str(e)}")
+            finally:
+                db.session.close()
+
+
+def _ensure_heartbeat(app):
+    """Start this process's lease heartbeat thread if it isn't running yet."""
+    global _heartbeat_thread
+    with _running_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat, args=(app,), daemon=True)
+            _heartbeat_thread.start()
+
+
+def start_workers(app, count=JOB_WORKERS):
+    """Start the job worker threads for this process.
+
+    Jobs live in the database, so jobs queued before a restart, and jobs whose
+    worker process died mid-run, are picked up again once their lease expires.
+    """
+    if count <= 0:
+        logger.info("Background job workers disabled by AGNOSTER_JOB_WORKERS")
+        return []
+
+    threads = [threading.Thread(target=_worker, args=(app,), daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    _ensure_heartbeat(app)
+    return threads + [_heartbeat_thread]
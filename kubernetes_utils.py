@@ -2,49 +2,226 @@ import subprocess
 import json
 import logging
 import os
+import math
+import random
 import shutil
+import threading
+import time
 from datetime import datetime, timedelta
-from models import Config, NamespaceBlacklist, NamespaceLog
-from app import db
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import accumulate
+from models import Config, Job, NamespaceBlacklist, NamespaceLog, ScaledWorkload
+from extensions import db
+import history_utils
+import usage_utils
+from shutdown_utils import dispatch_shutdowns
+from snapshot_utils import snapshots
 from flask_login import current_user
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Check if we're in demo mode without kubectl
-DEMO_MODE = False
-if shutil.which('kubectl') is None:
-    logger.warning("kubectl not found in PATH, running in DEMO MODE with sample data")
-    DEMO_MODE = True
+# kubectl binary to run; point it at a stub to exercise the cluster code paths
+# without a cluster (a fake API server can also be used through KUBECONFIG)
+KUBECTL = os.environ.get("AGNOSTER_KUBECTL", "kubectl")
 
-def run_kubectl_command(command):
-    """Run a kubectl command and return the output."""
-    # If we're in demo mode, don't try to run kubectl commands
-    if DEMO_MODE:
-        logger.debug(f"DEMO MODE: Skipping kubectl command: {command}")
-        # We'll handle specific commands in their respective functions
-        return "{}"  
-        
+@lru_cache(maxsize=None)
+def is_demo_mode():
+    """Check once, on first use, whether kubectl is missing and sample data should be served."""
+    if shutil.which(KUBECTL) is None:
+        logger.warning("kubectl not found in PATH, running in DEMO MODE with sample data")
+        return True
+    return False
+
+class KubectlError(Exception):
+    """A kubectl call failed."""
+    
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+class ClusterUnavailableError(KubectlError):
+    """The circuit breaker is open and kubectl calls are being skipped."""
+
+class BlacklistedNamespaceError(Exception):
+    """A blacklisted namespace was asked to start or stop."""
+    
+    def __init__(self, namespace):
+        super().__init__(f"Namespace {namespace} is blacklisted and cannot be started or stopped")
+        self.namespace = namespace
+
+def is_blacklisted(namespace):
+    """Whether a namespace is on the blacklist and must be left alone."""
+    return NamespaceBlacklist.query.filter_by(namespace_name=namespace).first() is not None
+
+class CircuitBreaker:
+    """Stop calling the API server after repeated transient failures.
+    
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail fast for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open); success closes the breaker, failure reopens it.
+    """
+    
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+    
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_in_flight):
+                raise ClusterUnavailableError("Kubernetes API unavailable, circuit breaker is open", transient=True)
+            if state == "half-open":
+                self._trial_in_flight = True
+    
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("kubectl circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.error(f"kubectl circuit breaker opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+# Execution limits, tunable per deployment
+KUBECTL_TIMEOUT = float(os.environ.get("AGNOSTER_KUBECTL_TIMEOUT", "30"))  # Seconds per call
+KUBECTL_MAX_IN_FLIGHT = int(os.environ.get("AGNOSTER_KUBECTL_MAX_IN_FLIGHT", "4"))  # Per process
+KUBECTL_RETRIES = int(os.environ.get("AGNOSTER_KUBECTL_RETRIES", "2"))
+KUBECTL_BACKOFF = 0.5  # Base delay in seconds, doubled per retry
+KUBECTL_MAX_BACKOFF = 5
+# Budget for one call including retries, slot waits and backoff. Kept well
+# under the gunicorn worker timeout (60s) so a hanging API server produces an
+# error, and the stale-snapshot fallback, before the worker is killed.
+KUBECTL_DEADLINE = float(os.environ.get("AGNOSTER_KUBECTL_DEADLINE", "40"))
+
+# stderr fragments that indicate a temporary API-server or network problem
+TRANSIENT_ERRORS = (
+    "connection refused",
+    "connection reset",
+    "i/o timeout",
+    "tls handshake timeout",
+    "unable to connect to the server",
+    "the server is currently unable to handle the request",
+    "service unavailable",
+    "too many requests",
+    "etcdserver: request timed out",
+    "unexpected eof",
+)
+
+_kubectl_slots = threading.BoundedSemaphore(KUBECTL_MAX_IN_FLIGHT)
+circuit_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("AGNOSTER_KUBECTL_FAILURE_THRESHOLD", "5")),
+    reset_timeout=float(os.environ.get("AGNOSTER_KUBECTL_RESET_TIMEOUT", "30"))
+)
+
+def _run_kubectl_once(args, timeout):
     try:
-        logger.debug(f"Running kubectl command: {command}")
         result = subprocess.run(
-            command,
-            shell=True,
+            args,
             check=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            text=True,
+            timeout=timeout
         )
         return result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        raise KubectlError(f"kubectl command timed out after {timeout}s", transient=True)
     except subprocess.CalledProcessError as e:
-        logger.error(f"kubectl command failed: {e}")
-        logger.error(f"Error output: {e.stderr}")
-        raise Exception(f"kubectl command failed: {e}")
+        stderr = (e.stderr or "").strip()
+        transient = any(fragment in stderr.lower() for fragment in TRANSIENT_ERRORS)
+        raise KubectlError(f"kubectl command failed: {stderr or e}", transient=transient)
+
+def run_kubectl_command(args, timeout=KUBECTL_TIMEOUT, deadline=KUBECTL_DEADLINE, slots=None):
+    """Run a kubectl command given as an argv list and return its output.
+    
+    Calls are capped per process, time out, are retried with jittered backoff
+    on transient errors, and fail fast while the circuit breaker is open.
+    Everything, retries included, finishes within `deadline` seconds. `slots`
+    is the semaphore capping concurrent calls (default: the shared pool).
+    """
+    # If we're in demo mode, don't try to run kubectl commands
+    if is_demo_mode():
+        logger.debug(f"DEMO MODE: Skipping kubectl command: {' '.join(args)}")
+        # We'll handle specific commands in their respective functions
+        return "{}"  
+    
+    slots = slots or _kubectl_slots
+    args = [KUBECTL] + list(args[1:])
+    give_up_at = time.monotonic() + deadline
+    for attempt in range(KUBECTL_RETRIES + 1):
+        remaining = give_up_at - time.monotonic()
+        # Waiting for a slot is local congestion, not an API-server problem,
+        # so it never touches the circuit breaker
+        if remaining <= 0 or not slots.acquire(timeout=remaining):
+            raise KubectlError("Timed out waiting for a free kubectl slot")
+        
+        try:
+            circuit_breaker.before_call()
+            try:
+                logger.debug(f"Running kubectl command: {' '.join(args)}")
+                output = _run_kubectl_once(args, max(0.1, min(timeout, give_up_at - time.monotonic())))
+            except KubectlError as e:
+                error = e
+            except BaseException as e:
+                # kubectl could not be started at all (missing binary, fork
+                # failing under memory pressure); this also ends a half-open trial
+                circuit_breaker.record_failure()
+                if not isinstance(e, Exception):
+                    raise
+                logger.error(f"Could not run kubectl: {str(e)}")
+                raise KubectlError(f"Could not run kubectl: {str(e)}") from e
+            else:
+                circuit_breaker.record_success()
+                return output
+        finally:
+            slots.release()
+        
+        if not error.transient:
+            # The API server answered (e.g. NotFound), so it is healthy
+            circuit_breaker.record_success()
+            logger.error(str(error))
+            raise error
+        
+        circuit_breaker.record_failure()
+        delay = random.uniform(0, min(KUBECTL_MAX_BACKOFF, KUBECTL_BACKOFF * 2 ** attempt))
+        if attempt == KUBECTL_RETRIES or time.monotonic() + delay >= give_up_at:
+            logger.error(f"{error} (giving up after {attempt + 1} attempts)")
+            raise error
+        
+        logger.warning(f"{error}; retrying in {delay:.2f}s")
+        time.sleep(delay)
 
-def get_all_namespaces():
-    """Get all Kubernetes namespaces."""
+def get_all_namespaces(pods=None):
+    """Get all Kubernetes namespaces.
+    
+    Pod counts come from one cluster-wide pod listing: `pods` when the
+    caller already has it (e.g. from the snapshot cache), else a fresh one.
+    """
     # In demo mode, provide sample namespace data
-    if DEMO_MODE:
+    if is_demo_mode():
         logger.info("DEMO MODE: Returning sample namespace data")
         
         # Get blacklisted namespaces
@@ -82,13 +259,16 @@ def get_all_namespaces():
         return [ns for ns in sample_namespaces if ns["name"] not in blacklisted]
     
     # Normal mode - use kubectl
-    command = "kubectl get namespaces -o json"
-    output = run_kubectl_command(command)
+    output = run_kubectl_command(["kubectl", "get", "namespaces", "-o", "json"])
     data = json.loads(output)
     
     # Get blacklisted namespaces
     blacklisted = [entry.namespace_name for entry in NamespaceBlacklist.query.all()]
     
+    pod_counts = {}
+    for pod in (pods if pods is not None else get_all_pods()):
+        pod_counts[pod["namespace"]] = pod_counts.get(pod["namespace"], 0) + 1
+    
     namespaces = []
     for item in data["items"]:
         namespace_name = item["metadata"]["name"]
@@ -100,18 +280,11 @@ def get_all_namespaces():
         created_at = item["metadata"]["creationTimestamp"]
         status = item["status"]["phase"]
         
-        # Get pod count for this namespace
-        pod_count_command = f"kubectl get pods -n {namespace_name} --no-headers 2>/dev/null | wc -l"
-        try:
-            pod_count = int(run_kubectl_command(pod_count_command))
-        except:
-            pod_count = 0
-        
         namespaces.append({
             "name": namespace_name,
             "status": status,
             "created_at": created_at,
-            "pod_count": pod_count
+            "pod_count": pod_counts.get(namespace_name, 0)
         })
     
     return namespaces
@@ -119,7 +292,7 @@ def get_all_namespaces():
 def get_pods_in_namespace(namespace):
     """Get all pods in a specific namespace."""
     # In demo mode, provide sample pod data for the specified namespace
-    if DEMO_MODE:
+    if is_demo_mode():
         logger.info(f"DEMO MODE: Returning sample pod data for namespace {namespace}")
         
         # Get all pods and filter by namespace
@@ -138,8 +311,7 @@ def get_pods_in_namespace(namespace):
         return namespace_pods
     
     # Normal mode - use kubectl
-    command = f"kubectl get pods -n {namespace} -o json"
-    output = run_kubectl_command(command)
+    output = run_kubectl_command(["kubectl", "get", "pods", "-n", namespace, "-o", "json"])
     data = json.loads(output)
     
     pods = []
@@ -180,7 +352,7 @@ def get_pods_in_namespace(namespace):
 def get_all_pods():
     """Get all pods across all namespaces."""
     # In demo mode, provide sample pod data
-    if DEMO_MODE:
+    if is_demo_mode():
         logger.info("DEMO MODE: Returning sample pod data")
         
         # Get blacklisted namespaces
@@ -257,8 +429,7 @@ def get_all_pods():
         return [pod for pod in sample_pods if pod["namespace"] not in blacklisted]
         
     # Normal mode - use kubectl
-    command = "kubectl get pods --all-namespaces -o json"
-    output = run_kubectl_command(command)
+    output = run_kubectl_command(["kubectl", "get", "pods", "--all-namespaces", "-o", "json"])
     data = json.loads(output)
     
     # Get blacklisted namespaces
@@ -296,8 +467,162 @@ def get_all_pods():
     
     return pods
 
+def get_namespace_usage():
+    """Get current CPU and memory usage per namespace from the metrics API.
+    
+    One cluster-wide call, the same data `kubectl top pods -A` shows. Returns
+    namespace -> {"cpu_millicores", "memory_mib"} summed over its pods, or an
+    empty dict in demo mode.
+    """
+    if is_demo_mode():
+        return {}
+    
+    output = run_kubectl_command(["kubectl", "get", "--raw", "/apis/metrics.k8s.io/v1beta1/pods"])
+    data = json.loads(output)
+    
+    usage = {}
+    for item in data.get("items", []):
+        namespace = item["metadata"]["namespace"]
+        totals = usage.setdefault(namespace, {"cpu_millicores": 0.0, "memory_mib": 0.0})
+        for container in item.get("containers", []):
+            container_usage = container.get("usage", {})
+            totals["cpu_millicores"] += usage_utils.parse_cpu(container_usage.get("cpu", "0"))
+            totals["memory_mib"] += usage_utils.parse_memory(container_usage.get("memory", "0"))
+    
+    return usage
+
+# Namespaces whose longest pod has used this share of the threshold are "near" it
+NEAR_THRESHOLD_RATIO = 0.8
+TOP_PODS_PER_NAMESPACE = 3
+
+def summarize_cluster(namespaces, pods, threshold_hours, policy="runtime", idle_hours=None):
+    """Aggregate namespace and pod listings into the dashboard summary.
+    
+    over_threshold and near_threshold always compare runtimes with the
+    threshold. next_shutdown is only predicted under the "runtime" policy:
+    the idle policies also depend on usage the monitor samples, so under
+    them it is None and the summary reports the policy instead.
+    """
+    pods_by_phase = {}
+    pods_by_namespace = {}
+    for pod in pods:
+        pods_by_phase[pod["status"]] = pods_by_phase.get(pod["status"], 0) + 1
+        pods_by_namespace.setdefault(pod["namespace"], []).append(pod)
+    
+    namespace_summaries = []
+    over_threshold = []
+    near_threshold = []
+    next_shutdown = None
+    for namespace in namespaces:
+        namespace_pods = pods_by_namespace.get(namespace["name"], [])
+        top_pods = sorted(namespace_pods, key=lambda pod: pod["runtime_hours"], reverse=True)[:TOP_PODS_PER_NAMESPACE]
+        max_runtime = top_pods[0]["runtime_hours"] if top_pods else 0
+        
+        is_over = max_runtime > threshold_hours
+        is_near = not is_over and max_runtime >= threshold_hours * NEAR_THRESHOLD_RATIO
+        if is_over:
+            over_threshold.append(namespace["name"])
+        elif is_near:
+            near_threshold.append(namespace["name"])
+        
+        # Namespaces already over the threshold are stopped on the next monitor tick
+        if namespace_pods and policy == "runtime":
+            hours_left = max(threshold_hours - max_runtime, 0)
+            if next_shutdown is None or hours_left < next_shutdown["hours"]:
+                next_shutdown = {"namespace": namespace["name"], "hours": round(hours_left, 2)}
+        
+        namespace_summaries.append({
+            "name": namespace["name"],
+            "status": namespace["status"],
+            "created_at": namespace["created_at"],
+            "pod_count": len(namespace_pods),
+            "max_runtime_hours": max_runtime,
+            "over_threshold": is_over,
+            "near_threshold": is_near,
+            "top_pods": [
+                {"name": pod["name"], "runtime_hours": pod["runtime_hours"]}
+                for pod in top_pods
+            ]
+        })
+    
+    return {
+        "shutdown_threshold": threshold_hours,
+        "shutdown_policy": policy,
+        "idle_hours": idle_hours,
+        "totals": {
+            "namespaces": len(namespaces),
+            "active_namespaces": sum(1 for ns in namespaces if ns["status"] == "Active"),
+            "pods": len(pods),
+            "long_running_pods": sum(1 for pod in pods if pod["runtime_hours"] > threshold_hours)
+        },
+        "pods_by_phase": pods_by_phase,
+        "namespaces": namespace_summaries,
+        "over_threshold": over_threshold,
+        "near_threshold": near_threshold,
+        "next_shutdown": next_shutdown
+    }
+
+def simulate_thresholds(runtimes_by_namespace, thresholds):
+    """Dry-run the shutdown rule for many thresholds in one pass.
+    
+    runtimes_by_namespace maps a namespace to its pods' runtimes in hours. A
+    namespace is stopped at threshold t when its longest-running pod exceeds
+    t, as in check_namespaces_to_shutdown(). The pod-hours saved are what its
+    pods ran after the moment the monitor would have stopped it.
+    
+    Results carry counts only; use simulated_shutdowns() for the names at
+    one threshold. A pod running r hours in a namespace whose longest pod
+    runs m hours saves min(r, m - t) at t < m, which equals the sum over
+    pods of (m - t)+ minus (m - r - t)+. Both sums come from sorted values
+    and suffix sums, so each threshold costs two bisects over all pods.
+    """
+    max_runtimes = []
+    ends, starts = [], []  # m and m - r for every pod
+    for runtimes in runtimes_by_namespace.values():
+        if not runtimes:
+            continue
+        longest = max(runtimes)
+        max_runtimes.append(longest)
+        for runtime in runtimes:
+            ends.append(longest)
+            starts.append(longest - runtime)
+    max_runtimes.sort()
+    ends.sort()
+    starts.sort()
+    end_suffix = list(accumulate(reversed(ends), initial=0))[::-1]
+    start_suffix = list(accumulate(reversed(starts), initial=0))[::-1]
+    
+    def excess(values, suffix, threshold):
+        # Sum of (value - threshold) over the values above threshold
+        i = bisect_right(values, threshold)
+        return suffix[i] - threshold * (len(values) - i)
+    
+    results = []
+    for threshold in thresholds:
+        pod_hours_saved = excess(ends, end_suffix, threshold) - excess(starts, start_suffix, threshold)
+        results.append({
+            "threshold": threshold,
+            "namespace_count": len(max_runtimes) - bisect_right(max_runtimes, threshold),
+            "pod_hours_saved": round(pod_hours_saved, 2)
+        })
+    
+    return results
+
+def simulated_shutdowns(runtimes_by_namespace, threshold):
+    """Namespaces the shutdown rule would stop at `threshold`, longest-running first."""
+    longest = {namespace: max(runtimes) for namespace, runtimes in runtimes_by_namespace.items() if runtimes}
+    stopping = [namespace for namespace, runtime in longest.items() if runtime > threshold]
+    return sorted(stopping, key=lambda namespace: longest[namespace], reverse=True)
+
 def check_namespaces_to_shutdown():
-    """Check all namespaces for pods running longer than the threshold."""
+    """Check all namespaces for pods running longer than the threshold.
+    
+    With the configured shutdown policy set to "idle" or "runtime_and_idle",
+    usage from the metrics API is sampled too and namespaces must also (or
+    instead) have been idle for the configured idle hours to be stopped.
+    """
+    import job_utils  # job_utils imports this module
+    
     logger.info("Checking namespaces for pods exceeding runtime threshold")
     
     # Get configuration
@@ -305,11 +630,15 @@ def check_namespaces_to_shutdown():
     if not config:
         logger.warning("No configuration found, using default threshold of 14 hours")
         threshold_hours = 14
+        monitoring_interval = 5
     else:
         threshold_hours = config.shutdown_threshold
+        monitoring_interval = config.monitoring_interval
     
-    # Get all pods
+    # Get all pods. Shutdown decisions always use a live listing; publishing
+    # it also refreshes the cached (and persisted) listing the API serves
     all_pods = get_all_pods()
+    snapshots.publish("all_pods", {"data": all_pods, "demo_mode": is_demo_mode()})
     
     # Group pods by namespace
     namespaces_to_check = {}
@@ -320,9 +649,12 @@ def check_namespaces_to_shutdown():
         if namespace not in namespaces_to_check:
             namespaces_to_check[namespace] = {
                 "max_runtime": runtime_hours,
+                "pod_count": 0,
                 "pods_exceeding_threshold": []
             }
         
+        namespaces_to_check[namespace]["pod_count"] += 1
+        
         # Update maximum runtime for the namespace
         if runtime_hours > namespaces_to_check[namespace]["max_runtime"]:
             namespaces_to_check[namespace]["max_runtime"] = runtime_hours
@@ -331,70 +663,256 @@ def check_namespaces_to_shutdown():
         if runtime_hours > threshold_hours:
             namespaces_to_check[namespace]["pods_exceeding_threshold"].append(pod["name"])
     
-    # Shutdown namespaces with pods exceeding threshold
-    for namespace, data in namespaces_to_check.items():
-        if data["pods_exceeding_threshold"]:
+    policy, idle_hours = usage_utils.shutdown_policy(config)
+    if policy != "runtime":
+        # Keep a little more than the idle period so averages cover all of it
+        usage_utils.usage_window.resize(idle_hours * 1.5)
+        # One metrics call per tick; if it fails nothing counts as idle this time
+        try:
+            usage_utils.usage_window.record(get_namespace_usage())
+            sampled = True
+        except Exception as e:
+            logger.warning(f"Could not sample namespace usage: {str(e)}")
+            sampled = False
+        for namespace, data in namespaces_to_check.items():
+            data["idle_hours"] = usage_utils.usage_window.idle_hours(namespace)
+            data["idle"] = sampled and usage_utils.usage_window.idle_for(namespace, idle_hours)
+    
+    def shutdown(namespace, data):
+        reasons = []
+        if policy != "idle":
             logger.info(f"Namespace {namespace} has pods running for more than {threshold_hours} hours")
             logger.info(f"Max runtime: {data['max_runtime']} hours")
             logger.info(f"Pods exceeding threshold: {', '.join(data['pods_exceeding_threshold'])}")
-            
-            # Log the shutdown event
-            log_entry = NamespaceLog(
-                namespace_name=namespace,
-                action="stop",
-                user_id=None,  # Automated action
-                details=f"Automatic shutdown due to pods running for more than {threshold_hours} hours. Pods: {', '.join(data['pods_exceeding_threshold'])}"
+            reasons.append(f"pods running for more than {threshold_hours} hours. Pods: {', '.join(data['pods_exceeding_threshold'])}")
+        if policy != "runtime":
+            averages = usage_utils.usage_window.averages(namespace) or {"cpu_millicores": 0, "memory_mib": 0}
+            logger.info(f"Namespace {namespace} has been idle for {data['idle_hours']:.2f} hours")
+            reasons.append(f"idle for {data['idle_hours']:.1f} hours "
+                           f"(avg {averages['cpu_millicores']}m CPU, {averages['memory_mib']} MiB memory)")
+        
+        # Execute the shutdown as a job, so it never overlaps a user's
+        # start or stop of the same namespace
+        logger.info(f"Shutting down namespace {namespace}")
+        job_utils.run_now("stop", namespace, {"automated": True})
+        
+        # Log the shutdown event
+        log_entry = NamespaceLog(
+            namespace_name=namespace,
+            action="stop",
+            user_id=None,  # Automated action
+            details=f"Automatic shutdown due to {' and '.join(reasons)}"
+        )
+        db.session.add(log_entry)
+        db.session.commit()
+    
+    # Shutdown namespaces that meet the policy, longest overrun first.
+    # Namespaces with a queued or running job are left to that job
+    busy = {job.active_namespace for job in Job.query.filter(Job.active_namespace.isnot(None)).all()}
+    candidates = []
+    for namespace, data in namespaces_to_check.items():
+        if namespace in busy:
+            logger.info(f"Not stopping namespace {namespace}: it has an active job")
+            continue
+        over_runtime = bool(data["pods_exceeding_threshold"])
+        idle = data.get("idle", False)
+        if policy == "runtime" and over_runtime:
+            candidates.append((namespace, data["max_runtime"] - threshold_hours, data))
+        elif policy == "runtime_and_idle" and over_runtime and idle:
+            candidates.append((namespace, data["max_runtime"] - threshold_hours, data))
+        elif policy == "idle" and idle:
+            candidates.append((namespace, data["idle_hours"] - idle_hours, data))
+    stopped = {
+        namespace: data["pod_count"]
+        for namespace, data in dispatch_shutdowns(candidates, shutdown).items()
+    }
+    
+    # Record this tick in the runtime history
+    try:
+        history_utils.record_tick(
+            namespaces_to_check, threshold_hours,
+            interval_hours=monitoring_interval / 60,
+            stopped=stopped
+        )
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording namespace history: {str(e)}")
+
+# Workload kinds that are scaled to zero when a namespace is stopped
+SCALABLE_KINDS = "deployments,statefulsets"
+# Resources per `kubectl scale` call, to keep the argv well below OS limits
+SCALE_BATCH_SIZE = 50
+READINESS_TIMEOUT = 300  # Seconds, also the longest wait a caller may ask for
+# Rollout waits can block for minutes, so they get their own small pool and
+# never take the slots that listings and the monitor depend on
+READINESS_MAX_IN_FLIGHT = 2
+_readiness_slots = threading.BoundedSemaphore(READINESS_MAX_IN_FLIGHT)
+
+def get_scalable_workloads(namespace):
+    """List Deployments and StatefulSets in a namespace with their replica counts."""
+    output = run_kubectl_command(["kubectl", "get", SCALABLE_KINDS, "-n", namespace, "-o", "json"])
+    data = json.loads(output)
+    
+    return [{
+        "kind": item["kind"],
+        "name": item["metadata"]["name"],
+        "replicas": item.get("spec", {}).get("replicas", 1)
+    } for item in data.get("items", [])]
+
+def scale_workloads(namespace, workloads, replicas):
+    """Scale workloads to a replica count, batching several per kubectl call."""
+    resources = [f"{workload['kind'].lower()}/{workload['name']}" for workload in workloads]
+    for i in range(0, len(resources), SCALE_BATCH_SIZE):
+        run_kubectl_command(
+            ["kubectl", "scale", "-n", namespace, f"--replicas={replicas}"] + resources[i:i + SCALE_BATCH_SIZE]
+        )
+
+def wait_for_workloads(namespace, workloads, timeout=READINESS_TIMEOUT):
+    """Wait in parallel until workloads finish rolling out; returns names still not ready.
+    
+    All waits share one deadline `timeout` seconds from now and run in the
+    separate readiness pool.
+    """
+    give_up_at = time.monotonic() + timeout
+    
+    def wait(workload):
+        resource = f"{workload['kind'].lower()}/{workload['name']}"
+        # Round up, so a short timeout still waits instead of giving up at once
+        remaining = math.ceil(give_up_at - time.monotonic())
+        if remaining <= 0:
+            return resource
+        try:
+            run_kubectl_command(
+                ["kubectl", "rollout", "status", resource, "-n", namespace, f"--timeout={remaining}s"],
+                timeout=remaining + 10,
+                deadline=remaining + 10,
+                slots=_readiness_slots
             )
-            db.session.add(log_entry)
-            db.session.commit()
-            
-            # Execute the shutdown
-            logger.info(f"Shutting down namespace {namespace}")
-            stop_namespace(namespace, automated=True)
+            return None
+        except KubectlError as e:
+            logger.warning(f"{resource} in {namespace} not ready: {str(e)}")
+            return resource
+    
+    with ThreadPoolExecutor(max_workers=READINESS_MAX_IN_FLIGHT) as executor:
+        return [resource for resource in executor.map(wait, workloads) if resource]
+
+def _acting_user_id(user_id=None):
+    """Return the user an action is attributed to: the given id, else the logged-in user."""
+    if user_id is None and current_user and current_user.is_authenticated:
+        return current_user.id
+    return user_id
 
-def start_namespace(namespace):
-    """Start/activate a namespace."""
+def start_namespace(namespace, wait=False, timeout=READINESS_TIMEOUT, user_id=None):
+    """Start/activate a namespace by restoring the replica counts saved at stop.
+    
+    Workloads sharing a replica count are scaled in one kubectl call and the
+    calls run in parallel. With wait=True, also wait up to `timeout` seconds
+    for the workloads to become ready. user_id attributes the action when it
+    runs outside a request, e.g. from a background job.
+    """
+    if is_blacklisted(namespace):
+        raise BlacklistedNamespaceError(namespace)
+    
     logger.info(f"Starting namespace {namespace}")
+    result = {"restored": 0, "not_ready": []}
+    timeout = max(1, min(float(timeout), READINESS_TIMEOUT))
     
-    # In a real implementation, this could involve recreating deployments or scaling them up
-    # For now, we'll just log the action
-    print(f"Starting {namespace}")
+    if is_demo_mode():
+        print(f"Starting {namespace}")
+    else:
+        saved = ScaledWorkload.query.filter_by(namespace_name=namespace).all()
+        workloads = [{"kind": row.kind, "name": row.name, "replicas": row.replicas} for row in saved]
+        
+        by_replicas = {}
+        for workload in workloads:
+            by_replicas.setdefault(workload["replicas"], []).append(workload)
+        
+        with ThreadPoolExecutor(max_workers=KUBECTL_MAX_IN_FLIGHT) as executor:
+            futures = [
+                executor.submit(scale_workloads, namespace, group, replicas)
+                for replicas, group in by_replicas.items()
+            ]
+            for future in futures:
+                future.result()
+        
+        # Every scale call succeeded, so the saved counts are no longer needed
+        for row in saved:
+            db.session.delete(row)
+        db.session.commit()
+        result["restored"] = len(workloads)
+        logger.info(f"Restored {len(workloads)} workloads in namespace {namespace}")
+        
+        if wait and workloads:
+            result["not_ready"] = wait_for_workloads(namespace, workloads, timeout)
     
     # Log the action
-    if current_user:
+    user_id = _acting_user_id(user_id)
+    if user_id is not None:
         log_entry = NamespaceLog(
             namespace_name=namespace,
             action="start",
-            user_id=current_user.id,
-            details="Namespace manually started"
+            user_id=user_id,
+            details=f"Namespace manually started, {result['restored']} workloads restored"
         )
         db.session.add(log_entry)
         db.session.commit()
     
-    return True
+    return result
 
-def stop_namespace(namespace, automated=False):
-    """Stop/shutdown a namespace."""
+def stop_namespace(namespace, automated=False, user_id=None):
+    """Stop/shutdown a namespace by scaling its Deployments and StatefulSets to zero.
+    
+    Replica counts are saved in the database before anything is scaled, so
+    start_namespace() can restore them even after a restart.
+    """
+    if is_blacklisted(namespace):
+        raise BlacklistedNamespaceError(namespace)
+    
     logger.info(f"Stopping namespace {namespace}")
+    scaled = 0
     
-    # In a real implementation, this could involve scaling down deployments
-    # For now, we'll just log the action
-    print(f"Shutting down {namespace}")
+    if is_demo_mode():
+        print(f"Shutting down {namespace}")
+    else:
+        workloads = [w for w in get_scalable_workloads(namespace) if w["replicas"] > 0]
+        
+        for workload in workloads:
+            row = ScaledWorkload.query.filter_by(
+                namespace_name=namespace, kind=workload["kind"], name=workload["name"]
+            ).first()
+            if row:
+                # Scaled back up by hand since the last stop; remember the new count
+                row.replicas = workload["replicas"]
+                row.stopped_at = datetime.utcnow()
+            else:
+                db.session.add(ScaledWorkload(
+                    namespace_name=namespace,
+                    kind=workload["kind"],
+                    name=workload["name"],
+                    replicas=workload["replicas"]
+                ))
+        db.session.commit()
+        
+        if workloads:
+            scale_workloads(namespace, workloads, 0)
+        scaled = len(workloads)
+        logger.info(f"Scaled {scaled} workloads in namespace {namespace} to zero")
     
     # Log the action if not already logged by automated process
-    if not automated and current_user:
+    user_id = _acting_user_id(user_id)
+    if not automated and user_id is not None:
         log_entry = NamespaceLog(
             namespace_name=namespace,
             action="stop",
-            user_id=current_user.id,
-            details="Namespace manually stopped"
+            user_id=user_id,
+            details=f"Namespace manually stopped, {scaled} workloads scaled to zero"
         )
         db.session.add(log_entry)
         db.session.commit()
     
-    return True
+    return {"scaled": scaled}
 
-def destroy_namespace(namespace):
+def destroy_namespace(namespace, user_id=None):
     """Destroy a namespace."""
     logger.info(f"Destroying namespace {namespace}")
     
@@ -403,11 +921,12 @@ def destroy_namespace(namespace):
     print(f"Destroying {namespace}")
     
     # Log the action
-    if current_user:
+    user_id = _acting_user_id(user_id)
+    if user_id is not None:
         log_entry = NamespaceLog(
             namespace_name=namespace,
             action="destroy",
-            user_id=current_user.id,
+            user_id=user_id,
             details="Namespace manually destroyed"
         )
         db.session.add(log_entry)
@@ -415,7 +934,7 @@ def destroy_namespace(namespace):
     
     return True
 
-def reset_namespace(namespace):
+def reset_namespace(namespace, user_id=None):
     """Reset a namespace monitoring state."""
     logger.info(f"Resetting namespace {namespace}")
     
@@ -424,11 +943,12 @@ def reset_namespace(namespace):
     print(f"Resetting {namespace}")
     
     # Log the action
-    if current_user:
+    user_id = _acting_user_id(user_id)
+    if user_id is not None:
         log_entry = NamespaceLog(
             namespace_name=namespace,
             action="reset",
-            user_id=current_user.id,
+            user_id=user_id,
             details="Namespace monitoring state reset"
         )
         db.session.add(log_entry)
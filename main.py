@@ -1,4 +1,12 @@
-from app import app  # noqa: F401
+from app import create_app, start_monitor
+import job_utils
+
+app = create_app()
+start_monitor(app)
+job_utils.start_workers(app)
 
 if __name__ == '__main__':
+    from app import init_db
+    with app.app_context():
+        init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
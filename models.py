@@ -1,4 +1,4 @@
-from app import db
+from extensions import db
 from flask_login import UserMixin
 from datetime import datetime
 
@@ -14,6 +14,8 @@ class Config(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     shutdown_threshold = db.Column(db.Integer, default=14)  # Hours
     monitoring_interval = db.Column(db.Integer, default=5)  # Minutes
+    shutdown_policy = db.Column(db.String(32), default="runtime")  # runtime, idle, runtime_and_idle
+    idle_hours = db.Column(db.Float, default=2)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class NamespaceBlacklist(db.Model):
@@ -30,3 +32,66 @@ class NamespaceLog(db.Model):
     details = db.Column(db.Text)
     
     user = db.relationship('User', backref=db.backref('logs', lazy=True))
+
+class NamespaceMetric(db.Model):
+    """Rolled-up runtime metrics for one namespace over one time bucket."""
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.Integer, nullable=False)  # Bucket width in seconds
+    bucket = db.Column(db.Integer, nullable=False)  # Bucket start, Unix seconds
+    namespace_name = db.Column(db.String(128), nullable=False)
+    samples = db.Column(db.Integer, default=0)  # Monitor ticks folded into this bucket
+    pod_count_sum = db.Column(db.Integer, default=0)
+    pod_count_max = db.Column(db.Integer, default=0)
+    max_runtime_hours = db.Column(db.Float, default=0)
+    over_threshold_samples = db.Column(db.Integer, default=0)
+    shutdowns = db.Column(db.Integer, default=0)
+    pod_hours_saved = db.Column(db.Float, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('resolution', 'namespace_name', 'bucket'),
+        db.Index('ix_namespace_metric_resolution_bucket', 'resolution', 'bucket'),
+    )
+
+class ScaledWorkload(db.Model):
+    """Replica count of a workload scaled to zero by a namespace stop."""
+    id = db.Column(db.Integer, primary_key=True)
+    namespace_name = db.Column(db.String(128), nullable=False, index=True)
+    kind = db.Column(db.String(32), nullable=False)  # Deployment or StatefulSet
+    name = db.Column(db.String(253), nullable=False)
+    replicas = db.Column(db.Integer, nullable=False)
+    stopped_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('namespace_name', 'kind', 'name'),
+    )
+
+class ShutdownWave(db.Model):
+    """Progress of one batch of automatic namespace shutdowns."""
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    total = db.Column(db.Integer, default=0)
+    completed = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(16), default="running")  # running, finished, interrupted
+
+class Job(db.Model):
+    """A namespace operation queued for the background job workers."""
+    id = db.Column(db.String(32), primary_key=True)
+    action = db.Column(db.String(64), nullable=False)  # start, stop, destroy, reset
+    namespace_name = db.Column(db.String(128), nullable=False, index=True)
+    # Set to the namespace while the job is queued or running, so the database
+    # rejects a second active job for the same namespace
+    active_namespace = db.Column(db.String(128), unique=True)
+    params = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(16), default="queued", index=True)  # queued, running, succeeded, failed
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    lease_expires = db.Column(db.DateTime)  # Running jobs past this are reclaimed
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    user = db.relationship('User')
@@ -0,0 +1,319 @@
+import _thread
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+try:
+    from gevent import monkey
+except ImportError:  # pragma: no cover - gevent is only needed for AGNOSTER_ASYNC
+    monkey = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Profiles are written to disk so any worker can serve them back
+PROFILE_DIR = os.path.abspath('instance/profiles')
+MAX_PROFILES = 50
+MAX_COUNT = 100
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+
+MONITOR_TARGET = "monitor"
+# Under gevent workers (AGNOSTER_ASYNC=1) all requests of a worker share one
+# OS thread, so a cProfile capture also records every other greenlet that
+# ran meanwhile. "sample" follows only the profiled request's greenlet.
+MODES = ("cprofile", "sample")
+FORMATS = {"cprofile": "pstats", "sample": "collapsed"}
+
+# Armed targets, target name -> {"remaining": int, "mode": str}, live in a
+# file so every worker sees them, whichever one handled the arming request
+ARMED_PATH = os.path.join(PROFILE_DIR, "armed.json")
+ARMED_LOCK_PATH = os.path.join(PROFILE_DIR, "armed.lock")
+
+_lock = threading.Lock()
+# ((mtime_ns, size), targets) of the armed file as last read by this process
+_armed_cache = (None, {})
+# Held while a cProfile capture runs; only one profiler can be active at a time
+_cprofile_lock = threading.Lock()
+
+
+def _gevent_patched():
+    return monkey is not None and monkey.is_module_patched("threading")
+
+
+def _original(module, name, default):
+    """Return the unpatched stdlib function under gevent, else `default`."""
+    return monkey.get_original(module, name) if _gevent_patched() else default
+
+
+class StackSampler:
+    """Periodically sample the calling thread's stack and aggregate collapsed stacks.
+
+    Sampling runs on a real OS thread even under gevent, where threading is
+    patched into greenlets that would never run while the profiled code
+    holds the CPU. There the profiled greenlet is followed: its own frame
+    while it waits, the OS thread's current frame while it runs.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.thread_id = _original("_thread", "get_ident", _thread.get_ident)()
+        self.greenlet = None
+        if _gevent_patched():
+            import greenlet
+            self.greenlet = greenlet.getcurrent()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopping = False
+        self._done = _original("_thread", "allocate_lock", _thread.allocate_lock)()
+        self._sleep = _original("time", "sleep", time.sleep)
+
+    def start(self):
+        self._done.acquire()
+        _original("_thread", "start_new_thread", _thread.start_new_thread)(self._run, ())
+
+    def stop(self):
+        self._stopping = True
+        # Released by the sampling thread once it has exited its loop
+        self._done.acquire()
+        self._done.release()
+
+    def _frame(self):
+        if self.greenlet is not None:
+            if self.greenlet.gr_frame is not None:
+                return self.greenlet.gr_frame  # Switched out, e.g. waiting on kubectl
+            if self.greenlet.dead:
+                return None
+        return sys._current_frames().get(self.thread_id)
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._sleep(self.interval)
+                self._sample()
+        finally:
+            self._done.release()
+
+    def _sample(self):
+        frame = self._frame()
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def arm(target, count=1, mode="cprofile"):
+    """Profile the next `count` runs of a route endpoint or the monitor tick."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    if not 1 <= count <= MAX_COUNT:
+        raise ValueError(f"count must be between 1 and {MAX_COUNT}")
+
+    with _armed_file() as armed:
+        armed[target] = {"remaining": count, "mode": mode}
+    logger.info(f"Profiling armed for {target}: next {count} run(s) using {mode}")
+
+
+def disarm(target=None):
+    """Stop profiling a target, or every target when none is given."""
+    with _armed_file() as armed:
+        if target is None:
+            armed.clear()
+        else:
+            armed.pop(target, None)
+
+
+def armed_targets():
+    """Return a copy of the currently armed targets."""
+    return _read_armed()
+
+
+def _read_armed():
+    try:
+        with open(ARMED_PATH) as f:
+            armed = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return armed if isinstance(armed, dict) else {}
+
+
+@contextmanager
+def _armed_file():
+    """Lock the armed targets across workers and yield them for changing in place."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _lock, open(ARMED_LOCK_PATH, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        armed = _read_armed()
+        yield armed
+        tmp_path = f"{ARMED_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(armed, f)
+        os.replace(tmp_path, ARMED_PATH)
+        # The lock is released when lock_file is closed
+
+
+def _claim(target):
+    """Consume one armed run for a target and return its mode, or None."""
+    global _armed_cache
+
+    # Fast path: one stat, and the file is only read again after it changed
+    try:
+        stat = os.stat(ARMED_PATH)
+    except OSError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached_version, cached = _armed_cache
+    if version != cached_version:
+        cached = _read_armed()
+        _armed_cache = (version, cached)
+    if target not in cached:
+        return None
+
+    with _armed_file() as armed:
+        state = armed.get(target)
+        if not state:
+            return None
+        state["remaining"] -= 1
+        if state["remaining"] <= 0:
+            del armed[target]
+        return state["mode"]
+
+
+def _start(mode):
+    """Start a profiler and return (mode, profiler).
+
+    cProfile captures are serialized, since a second active profiler raises
+    ValueError on Python 3.12+. While one runs, other captures fall back to
+    stack sampling instead of failing the request or tick.
+    """
+    if mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            return mode, profiler
+        except ValueError as e:
+            # Another tool (e.g. a debugger or coverage) already holds the profiler hook
+            _cprofile_lock.release()
+            logger.warning(f"cProfile unavailable, sampling instead: {str(e)}")
+
+    profiler = StackSampler()
+    profiler.start()
+    return "sample", profiler
+
+
+def _finish(target, mode, profiler, started):
+    if mode == "cprofile":
+        profiler.disable()
+        _cprofile_lock.release()
+    else:
+        profiler.stop()
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{target}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{FORMATS[mode]}")
+
+    try:
+        if mode == "cprofile":
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        logger.info(f"Saved profile {profile_id} ({duration_ms:.1f} ms)")
+    except OSError as e:
+        logger.error(f"Failed to write profile {profile_id}: {str(e)}")
+        return
+
+    _prune()
+
+
+def _prune():
+    """Keep only the newest MAX_PROFILES files on disk."""
+    profiles = list_profiles()
+    for profile in profiles[MAX_PROFILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, profile["file"]))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """List saved profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        profile_id, _, fmt = entry.name.rpartition(".")
+        if fmt not in FORMATS.values():
+            continue
+        stat = entry.stat()
+        profiles.append((stat.st_mtime, {
+            "id": profile_id,
+            "format": fmt,
+            "file": entry.name,
+            "size": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }))
+    profiles.sort(key=lambda p: p[0], reverse=True)
+    return [profile for _, profile in profiles]
+
+
+def find_profile(profile_id):
+    """Return the saved profile with the given id, or None."""
+    for profile in list_profiles():
+        if profile["id"] == profile_id:
+            return profile
+    return None
+
+
+def begin_request(endpoint):
+    """Start profiling the current request if its endpoint is armed."""
+    mode = _claim(endpoint)
+    if mode is None:
+        return
+    g._profile = (endpoint, *_start(mode), time.perf_counter())
+
+
+def end_request():
+    """Finish profiling the current request, if one was started."""
+    state = g.pop("_profile", None)
+    if state is not None:
+        _finish(*state)
+
+
+@contextmanager
+def profile_monitor_tick():
+    """Profile one monitoring tick if the monitor target is armed."""
+    mode = _claim(MONITOR_TARGET)
+    if mode is None:
+        yield
+        return
+
+    mode, profiler = _start(mode)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _finish(MONITOR_TARGET, mode, profiler, started)
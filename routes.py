@@ -0,0 +1,684 @@
+import calendar
+import logging
+import time
+from datetime import datetime
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, jsonify, flash, send_from_directory
+from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
+from extensions import db, login_manager
+from models import User, Config, NamespaceBlacklist, ShutdownWave, Job
+from kubernetes_utils import (
+    get_all_namespaces, get_pods_in_namespace, 
+    get_all_pods, summarize_cluster, simulate_thresholds, simulated_shutdowns,
+    is_demo_mode, is_blacklisted, circuit_breaker, READINESS_TIMEOUT
+)
+from snapshot_utils import snapshots, snapshot_response
+import history_utils
+import job_utils
+import profiling_utils
+import usage_utils
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('main', __name__)
+
+# User loader callback for Flask-Login
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
+
+def release_db_connection():
+    """Return the request's pooled DB connection before slow cluster I/O.
+    
+    Under gevent workers (AGNOSTER_ASYNC=1) hundreds of requests can be waiting
+    on kubectl at once; holding a pooled connection for each of them would
+    exhaust the pool long before the workers run out of greenlets.
+    """
+    db.session.close()
+
+# On-demand request profiling (no-op unless an admin armed the endpoint)
+@bp.before_app_request
+def start_request_profile():
+    profiling_utils.begin_request(request.endpoint)
+
+@bp.teardown_app_request
+def finish_request_profile(exception=None):
+    profiling_utils.end_request()
+
+# Health check for load balancers and readiness probes
+@bp.route('/healthz')
+def healthz():
+    checks = {}
+    try:
+        # Also confirms `init-db` has run: the config row is seeded there
+        checks["database"] = "ok" if Config.query.first() else "not initialized"
+    except Exception as e:
+        logger.warning(f"Health check database error: {str(e)}")
+        checks["database"] = "unavailable"
+    
+    ready = all(status == "ok" for status in checks.values())
+    return jsonify({
+        "status": "ready" if ready else "unavailable",
+        "checks": checks,
+        "startup_ms": current_app.config.get("STARTUP_MS"),
+        "cluster": circuit_breaker.state,
+        "demo_mode": is_demo_mode()
+    }), 200 if ready else 503
+
+# Routes
+@bp.route('/')
+def index():
+    return redirect(url_for('main.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        # Check if it's the admin's first login
+        if current_user.is_admin and current_user.first_login:
+            return redirect(url_for('main.change_password'))
+        return redirect(url_for('main.dashboard'))
+    
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        
+        user = User.query.filter_by(username=username).first()
+        
+        if user and check_password_hash(user.password_hash, password):
+            login_user(user)
+            
+            # Check if it's the admin's first login
+            if user.is_admin and user.first_login:
+                return redirect(url_for('main.change_password'))
+            
+            return redirect(url_for('main.dashboard'))
+        else:
+            flash('Invalid username or password', 'error')
+    
+    return render_template('login.html')
+
+@bp.route('/change_password', methods=['GET', 'POST'])
+@login_required
+def change_password():
+    if not current_user.first_login and not current_user.is_admin:
+        return redirect(url_for('main.dashboard'))
+    
+    if request.method == 'POST':
+        new_password = request.form.get('new_password')
+        confirm_password = request.form.get('confirm_password')
+        
+        if new_password != confirm_password:
+            flash('Passwords do not match', 'error')
+            return render_template('change_password.html')
+        
+        current_user.password_hash = generate_password_hash(new_password)
+        current_user.first_login = False
+        db.session.commit()
+        
+        flash('Password changed successfully. Please login with your new password.', 'success')
+        logout_user()
+        return redirect(url_for('main.login'))
+    
+    return render_template('change_password.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.login'))
+
+@bp.route('/ui')
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    return render_template('dashboard.html', is_admin=current_user.is_admin, demo_mode=is_demo_mode())
+
+@bp.route('/admin')
+@login_required
+def admin():
+    if not current_user.is_admin:
+        flash('Access denied. You must be an admin to view this page.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    config = Config.query.first()
+    blacklist = NamespaceBlacklist.query.all()
+    users = User.query.all()
+    
+    return render_template('admin.html', 
+                          config=config, 
+                          blacklist=blacklist, 
+                          users=users,
+                          demo_mode=is_demo_mode())
+
+def parse_timestamp(value, default):
+    """Parse a UTC timestamp query argument into Unix seconds."""
+    if not value:
+        return default
+    return int(calendar.timegm(datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").timetuple()))
+
+# Cached cluster snapshots shared by the API endpoints
+def namespaces_snapshot():
+    # Pod counts come from the cached pod listing, not one kubectl call per namespace
+    return snapshots.get("namespaces", lambda: {
+        "data": get_all_namespaces(all_pods_snapshot().payload["data"]),
+        "demo_mode": is_demo_mode()
+    })
+
+def all_pods_snapshot():
+    return snapshots.get("all_pods", lambda: {
+        "data": get_all_pods(),
+        "demo_mode": is_demo_mode()
+    })
+
+def build_summary():
+    config = Config.query.first()
+    namespaces = namespaces_snapshot()
+    pods = all_pods_snapshot()
+    policy, idle_hours = usage_utils.shutdown_policy(config)
+    summary = summarize_cluster(
+        namespaces.payload["data"],
+        pods.payload["data"],
+        config.shutdown_threshold if config else 14,
+        policy=policy,
+        idle_hours=idle_hours
+    )
+    summary["monitoring_interval"] = config.monitoring_interval if config else 5
+    summary["demo_mode"] = is_demo_mode()
+    if namespaces.stale or pods.stale:
+        summary["stale"] = True
+    return summary
+
+# API endpoints
+@bp.route('/api/summary')
+@login_required
+def api_summary():
+    try:
+        release_db_connection()
+        return snapshot_response(snapshots.get("summary", build_summary), request)
+    except Exception as e:
+        logger.error(f"Error building summary: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/history')
+@login_required
+def api_history():
+    now = int(time.time())
+    try:
+        end = parse_timestamp(request.args.get('end'), now)
+        start = parse_timestamp(request.args.get('start'), end - 86400)
+    except ValueError:
+        return jsonify({"error": "start and end must be formatted as YYYY-MM-DDTHH:MM:SSZ"}), 400
+    
+    if start >= end:
+        return jsonify({"error": "start must be before end"}), 400
+    
+    resolution = request.args.get('resolution')
+    if resolution and resolution not in history_utils.RESOLUTIONS:
+        return jsonify({"error": f"resolution must be one of {', '.join(history_utils.RESOLUTIONS)}"}), 400
+    
+    try:
+        history = history_utils.query_history(
+            start, end,
+            resolution=history_utils.RESOLUTIONS.get(resolution),
+            namespace=request.args.get('namespace')
+        )
+        return jsonify(history)
+    except Exception as e:
+        logger.error(f"Error querying history: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+MAX_SIMULATED_THRESHOLDS = 500
+
+@bp.route('/api/simulate', methods=['POST'])
+@login_required
+def api_simulate():
+    data = request.json or {}
+    
+    try:
+        if 'thresholds' in data:
+            if len(data['thresholds']) > MAX_SIMULATED_THRESHOLDS:
+                return jsonify({"error": f"At most {MAX_SIMULATED_THRESHOLDS} thresholds can be simulated at once"}), 400
+            thresholds = [float(value) for value in data['thresholds']]
+        elif 'range' in data:
+            start = float(data['range']['start'])
+            stop = float(data['range']['stop'])
+            step = float(data['range'].get('step', 1))
+            if step <= 0:
+                raise ValueError("step must be positive")
+            count = int((stop - start) / step) + 1
+            # Check the size before building anything from client input
+            if count > MAX_SIMULATED_THRESHOLDS:
+                return jsonify({"error": f"At most {MAX_SIMULATED_THRESHOLDS} thresholds can be simulated at once"}), 400
+            thresholds = [round(start + i * step, 4) for i in range(max(count, 0))]
+        else:
+            return jsonify({"error": "thresholds or range is required"}), 400
+    except (TypeError, ValueError, KeyError, OverflowError) as e:
+        return jsonify({"error": f"Invalid thresholds: {str(e)}"}), 400
+    
+    if not thresholds:
+        return jsonify({"error": "No thresholds to simulate"}), 400
+    if len(thresholds) > MAX_SIMULATED_THRESHOLDS:
+        return jsonify({"error": f"At most {MAX_SIMULATED_THRESHOLDS} thresholds can be simulated at once"}), 400
+    
+    # Namespace names are listed for one threshold only, not the whole sweep
+    try:
+        namespaces_at = float(data['namespaces_at']) if data.get('namespaces_at') is not None else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid namespaces_at: {str(e)}"}), 400
+    
+    try:
+        if data.get('at'):
+            # Replay a historical snapshot from the runtime history
+            try:
+                timestamp = parse_timestamp(data['at'], None)
+            except ValueError:
+                return jsonify({"error": "at must be formatted as YYYY-MM-DDTHH:MM:SSZ"}), 400
+            bucket, runtimes = history_utils.runtimes_at(timestamp)
+            if bucket is None:
+                return jsonify({"error": f"No history recorded at {data['at']}"}), 404
+            blacklisted = {entry.namespace_name for entry in NamespaceBlacklist.query.all()}
+            runtimes = {ns: values for ns, values in runtimes.items() if ns not in blacklisted}
+            source = {"type": "history", "at": datetime.utcfromtimestamp(bucket).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        else:
+            release_db_connection()
+            pods = all_pods_snapshot()
+            runtimes = {}
+            for pod in pods.payload["data"]:
+                runtimes.setdefault(pod["namespace"], []).append(pod["runtime_hours"])
+            source = {"type": "current", "stale": pods.stale}
+        
+        config = Config.query.first()
+        current_threshold = config.shutdown_threshold if config else 14
+        if namespaces_at is None:
+            namespaces_at = current_threshold
+        return jsonify({
+            "source": source,
+            "current_threshold": current_threshold,
+            # Results only model the runtime rule; idle policies also need usage data
+            "shutdown_policy": usage_utils.shutdown_policy(config)[0],
+            "results": simulate_thresholds(runtimes, sorted(set(thresholds))),
+            "namespaces_at": namespaces_at,
+            "namespaces": simulated_shutdowns(runtimes, namespaces_at)
+        })
+    except Exception as e:
+        logger.error(f"Error simulating thresholds: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/namespaces')
+@login_required
+def api_namespaces():
+    try:
+        release_db_connection()
+        return snapshot_response(namespaces_snapshot(), request)
+    except Exception as e:
+        logger.error(f"Error getting namespaces: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/pods/<namespace>')
+@login_required
+def api_pods(namespace):
+    try:
+        release_db_connection()
+        pods = get_pods_in_namespace(namespace)
+        return jsonify({
+            "data": pods,
+            "demo_mode": is_demo_mode()
+        })
+    except Exception as e:
+        logger.error(f"Error getting pods for namespace {namespace}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/all_pods')
+@login_required
+def api_all_pods():
+    try:
+        release_db_connection()
+        return snapshot_response(all_pods_snapshot(), request)
+    except Exception as e:
+        logger.error(f"Error getting all pods: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def queue_namespace_job(action, namespace, params=None):
+    """Queue a namespace action and answer with its job, 202 Accepted."""
+    try:
+        job, created = job_utils.enqueue(action, namespace, params, user_id=current_user.id)
+    except job_utils.JobConflictError as e:
+        return jsonify({"error": str(e), "job": job_utils.describe_job(e.job)}), 409
+    
+    if created:
+        message = f"Queued {action} for namespace {namespace}"
+    else:
+        message = f"A {action} for namespace {namespace} is already {job.status}"
+    return jsonify({
+        "status": "accepted",
+        "message": message,
+        "job_id": job.id,
+        "job": job_utils.describe_job(job),
+        "demo_mode": is_demo_mode()
+    }), 202
+
+@bp.route('/api/namespace/<namespace>/start', methods=['POST'])
+@login_required
+def api_start_namespace(namespace):
+    options = request.get_json(silent=True) or {}
+    try:
+        wait = bool(options.get('wait', False))
+        timeout = float(options.get('timeout', READINESS_TIMEOUT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "timeout must be a number of seconds"}), 400
+    if not timeout > 0:
+        return jsonify({"error": "timeout must be greater than 0"}), 400
+    # Longer waits would only tie up a readiness slot
+    timeout = min(timeout, READINESS_TIMEOUT)
+    
+    try:
+        if is_blacklisted(namespace):
+            return jsonify({"error": f"Namespace {namespace} is blacklisted"}), 403
+        return queue_namespace_job("start", namespace, {"wait": wait, "timeout": timeout})
+    except Exception as e:
+        logger.error(f"Error starting namespace {namespace}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/namespace/<namespace>/stop', methods=['POST'])
+@login_required
+def api_stop_namespace(namespace):
+    try:
+        if is_blacklisted(namespace):
+            return jsonify({"error": f"Namespace {namespace} is blacklisted"}), 403
+        return queue_namespace_job("stop", namespace)
+    except Exception as e:
+        logger.error(f"Error stopping namespace {namespace}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/namespace/<namespace>/destroy', methods=['POST'])
+@login_required
+def api_destroy_namespace(namespace):
+    try:
+        return queue_namespace_job("destroy", namespace)
+    except Exception as e:
+        logger.error(f"Error destroying namespace {namespace}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/namespace/<namespace>/reset', methods=['POST'])
+@login_required
+def api_reset_namespace(namespace):
+    try:
+        return queue_namespace_job("reset", namespace)
+    except Exception as e:
+        logger.error(f"Error resetting namespace {namespace}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/jobs/<job_id>')
+@login_required
+def api_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job_utils.describe_job(job))
+
+@bp.route('/api/config', methods=['GET', 'PUT'])
+@login_required
+def api_config():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    if request.method == 'GET':
+        config = Config.query.first()
+        if not config:
+            return jsonify({"error": "Configuration not found"}), 404
+        
+        policy, idle_hours = usage_utils.shutdown_policy(config)
+        return jsonify({
+            "shutdown_threshold": config.shutdown_threshold,
+            "monitoring_interval": config.monitoring_interval,
+            "shutdown_policy": policy,
+            "idle_hours": idle_hours
+        })
+    
+    elif request.method == 'PUT':
+        data = request.json
+        config = Config.query.first()
+        
+        if not config:
+            config = Config()
+            db.session.add(config)
+        
+        if 'shutdown_threshold' in data:
+            config.shutdown_threshold = data['shutdown_threshold']
+        
+        if 'monitoring_interval' in data:
+            config.monitoring_interval = data['monitoring_interval']
+        
+        if 'shutdown_policy' in data:
+            if data['shutdown_policy'] not in usage_utils.SHUTDOWN_POLICIES:
+                return jsonify({"error": f"shutdown_policy must be one of {', '.join(usage_utils.SHUTDOWN_POLICIES)}"}), 400
+            config.shutdown_policy = data['shutdown_policy']
+        
+        if 'idle_hours' in data:
+            try:
+                idle_hours = float(data['idle_hours'])
+            except (TypeError, ValueError):
+                return jsonify({"error": "idle_hours must be a number"}), 400
+            if not idle_hours > 0:
+                return jsonify({"error": "idle_hours must be greater than 0"}), 400
+            config.idle_hours = idle_hours
+        
+        db.session.commit()
+        snapshots.invalidate("summary")
+        return jsonify({"status": "success", "message": "Configuration updated"})
+
+@bp.route('/api/blacklist', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def api_blacklist():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    if request.method == 'GET':
+        blacklist = NamespaceBlacklist.query.all()
+        return jsonify([entry.namespace_name for entry in blacklist])
+    
+    elif request.method == 'POST':
+        data = request.json
+        namespace = data.get('namespace')
+        
+        if not namespace:
+            return jsonify({"error": "Namespace is required"}), 400
+        
+        existing = NamespaceBlacklist.query.filter_by(namespace_name=namespace).first()
+        if existing:
+            return jsonify({"error": "Namespace already in blacklist"}), 400
+        
+        blacklist_entry = NamespaceBlacklist(namespace_name=namespace)
+        db.session.add(blacklist_entry)
+        db.session.commit()
+        snapshots.invalidate()
+        
+        return jsonify({"status": "success", "message": f"Added {namespace} to blacklist"})
+    
+    elif request.method == 'DELETE':
+        data = request.json
+        namespace = data.get('namespace')
+        
+        if not namespace:
+            return jsonify({"error": "Namespace is required"}), 400
+        
+        entry = NamespaceBlacklist.query.filter_by(namespace_name=namespace).first()
+        if not entry:
+            return jsonify({"error": "Namespace not found in blacklist"}), 404
+        
+        db.session.delete(entry)
+        db.session.commit()
+        snapshots.invalidate()
+        
+        return jsonify({"status": "success", "message": f"Removed {namespace} from blacklist"})
+
+@bp.route('/api/users', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@login_required
+def api_users():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    if request.method == 'GET':
+        users = User.query.all()
+        return jsonify([{
+            "id": user.id,
+            "username": user.username,
+            "is_admin": user.is_admin,
+            "first_login": user.first_login
+        } for user in users])
+    
+    elif request.method == 'POST':
+        data = request.json
+        username = data.get('username')
+        password = data.get('password')
+        is_admin = data.get('is_admin', False)
+        
+        if not username or not password:
+            return jsonify({"error": "Username and password are required"}), 400
+        
+        existing = User.query.filter_by(username=username).first()
+        if existing:
+            return jsonify({"error": "Username already exists"}), 400
+        
+        user = User(
+            username=username,
+            password_hash=generate_password_hash(password),
+            is_admin=is_admin,
+            first_login=True
+        )
+        db.session.add(user)
+        db.session.commit()
+        
+        return jsonify({
+            "status": "success", 
+            "message": f"User {username} created",
+            "user": {
+                "id": user.id,
+                "username": user.username,
+                "is_admin": user.is_admin
+            }
+        })
+    
+    elif request.method == 'PUT':
+        data = request.json
+        user_id = data.get('id')
+        
+        if not user_id:
+            return jsonify({"error": "User ID is required"}), 400
+        
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        
+        if 'username' in data:
+            user.username = data['username']
+        
+        if 'password' in data and data['password']:
+            user.password_hash = generate_password_hash(data['password'])
+            user.first_login = True
+        
+        if 'is_admin' in data:
+            user.is_admin = data['is_admin']
+        
+        db.session.commit()
+        
+        return jsonify({
+            "status": "success", 
+            "message": f"User {user.username} updated"
+        })
+    
+    elif request.method == 'DELETE':
+        data = request.json
+        user_id = data.get('id')
+        
+        if not user_id:
+            return jsonify({"error": "User ID is required"}), 400
+        
+        # Don't allow deleting your own account
+        if int(user_id) == current_user.id:
+            return jsonify({"error": "Cannot delete your own account"}), 400
+        
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        
+        db.session.delete(user)
+        db.session.commit()
+        
+        return jsonify({
+            "status": "success", 
+            "message": f"User deleted"
+        })
+
+@bp.route('/api/shutdown_waves')
+@login_required
+def api_shutdown_waves():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    waves = ShutdownWave.query.order_by(ShutdownWave.id.desc()).limit(20).all()
+    return jsonify([{
+        "id": wave.id,
+        "status": wave.status,
+        "started_at": wave.started_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "finished_at": wave.finished_at.strftime("%Y-%m-%dT%H:%M:%SZ") if wave.finished_at else None,
+        "total": wave.total,
+        "completed": wave.completed,
+        "failed": wave.failed
+    } for wave in waves])
+
+@bp.route('/api/profiling', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def api_profiling():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    if request.method == 'GET':
+        return jsonify({
+            "armed": profiling_utils.armed_targets(),
+            "profiles": profiling_utils.list_profiles()
+        })
+    
+    elif request.method == 'POST':
+        data = request.json or {}
+        target = data.get('target')
+        mode = data.get('mode', 'cprofile')
+        
+        if not target:
+            return jsonify({"error": "Target is required"}), 400
+        
+        # Accept bare view names as well as blueprint-qualified endpoints
+        if target != profiling_utils.MONITOR_TARGET and target not in current_app.view_functions:
+            target = f"{bp.name}.{target}"
+            if target not in current_app.view_functions:
+                return jsonify({"error": f"Unknown target {data['target']}"}), 400
+        
+        try:
+            count = int(data.get('count', 1))
+            profiling_utils.arm(target, count=count, mode=mode)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify({
+            "status": "success",
+            "message": f"Profiling next {count} run(s) of {target} using {mode}"
+        })
+    
+    elif request.method == 'DELETE':
+        data = request.get_json(silent=True) or {}
+        profiling_utils.disarm(data.get('target'))
+        return jsonify({"status": "success", "message": "Profiling disarmed"})
+
+@bp.route('/api/profiling/<profile_id>')
+@login_required
+def api_profiling_download(profile_id):
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    profile = profiling_utils.find_profile(profile_id)
+    if not profile:
+        return jsonify({"error": "Profile not found"}), 404
+    
+    return send_from_directory(profiling_utils.PROFILE_DIR, profile["file"], as_attachment=True)
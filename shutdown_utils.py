@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from models import ShutdownWave
+from extensions import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Pace of automatic shutdowns, to keep API-server and controller load flat
+SHUTDOWN_RATE = float(os.environ.get("AGNOSTER_SHUTDOWN_RATE", "1"))  # Namespaces per second
+SHUTDOWN_BURST = int(os.environ.get("AGNOSTER_SHUTDOWN_BURST", "5"))
+SHUTDOWN_MAX_IN_FLIGHT = int(os.environ.get("AGNOSTER_SHUTDOWN_MAX_IN_FLIGHT", "4"))
+
+if SHUTDOWN_RATE <= 0:
+    logger.warning(f"AGNOSTER_SHUTDOWN_RATE must be above 0, got {SHUTDOWN_RATE:g}; using 1")
+    SHUTDOWN_RATE = 1.0
+if SHUTDOWN_BURST < 1:
+    logger.warning(f"AGNOSTER_SHUTDOWN_BURST must be at least 1, got {SHUTDOWN_BURST}; using 5")
+    SHUTDOWN_BURST = 5
+if SHUTDOWN_MAX_IN_FLIGHT < 1:
+    logger.warning(f"AGNOSTER_SHUTDOWN_MAX_IN_FLIGHT must be at least 1, got {SHUTDOWN_MAX_IN_FLIGHT}; using 4")
+    SHUTDOWN_MAX_IN_FLIGHT = 4
+
+
+class TokenBucket:
+    """Allow `rate` operations per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = TokenBucket(SHUTDOWN_RATE, SHUTDOWN_BURST)
+
+
+def mark_interrupted_waves():
+    """Close out waves left "running" by a monitor that died mid-wave.
+
+    Call when a monitor starts, before it can begin a wave of its own.
+    Returns the number of waves marked "interrupted".
+    """
+    count = ShutdownWave.query.filter_by(status="running").update({ShutdownWave.status: "interrupted"})
+    db.session.commit()
+    if count:
+        logger.warning(f"Marked {count} unfinished shutdown waves as interrupted")
+    return count
+
+
+def dispatch_shutdowns(candidates, shutdown, max_in_flight=SHUTDOWN_MAX_IN_FLIGHT, bucket=None):
+    """Stop namespaces as a paced wave and return the ones that were stopped.
+
+    candidates is a list of (namespace, overrun_hours, data) tuples; the
+    longest overrun goes first. shutdown(namespace, data) runs in a worker
+    thread with its own app context. At most `max_in_flight` shutdowns run
+    at once and new ones start no faster than the token bucket allows.
+    Progress is written to a ShutdownWave row as each namespace finishes.
+    """
+    if not candidates:
+        return {}
+
+    bucket = bucket or _bucket
+    app = current_app._get_current_object()
+    ordered = sorted(candidates, key=lambda candidate: candidate[1], reverse=True)
+
+    wave = ShutdownWave(total=len(ordered))
+    db.session.add(wave)
+    db.session.commit()
+    wave_id = wave.id
+    logger.info(f"Shutdown wave {wave_id}: stopping {len(ordered)} namespaces, "
+                f"{max_in_flight} at a time, {SHUTDOWN_RATE:g}/s")
+
+    def run(candidate):
+        namespace, _, data = candidate
+        bucket.acquire()
+        with app.app_context():
+            try:
+                shutdown(namespace, data)
+                succeeded = True
+                counter = ShutdownWave.completed
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Shutdown wave {wave_id}: failed to stop {namespace}: {str(e)}")
+                succeeded = False
+                counter = ShutdownWave.failed
+
+            ShutdownWave.query.filter_by(id=wave_id).update({counter: counter + 1})
+            db.session.commit()
+            progress = db.session.get(ShutdownWave, wave_id)
+            logger.info(f"Shutdown wave {wave_id}: {progress.completed + progress.failed}/{progress.total} done "
+                        f"({progress.failed} failed)")
+            return namespace, succeeded
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        results = list(executor.map(run, ordered))
+
+    wave = db.session.get(ShutdownWave, wave_id)
+    wave.status = "finished"
+    wave.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    stopped = {namespace for namespace, succeeded in results if succeeded}
+    return {namespace: data for namespace, _, data in ordered if namespace in stopped}
@@ -0,0 +1,373 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from flask import Response, current_app
+from env_utils import env_flag
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional codec
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How long a cluster listing is reused before kubectl is asked again
+SNAPSHOT_TTL = float(os.environ.get("AGNOSTER_SNAPSHOT_TTL", "5"))
+
+# While a refresh runs, other callers get the previous snapshot; after this
+# many seconds it is flagged as stale so clients can tell the data is held up
+REFRESH_GRACE = 2
+# Callers with no snapshot to fall back on wait this long for the first load
+COLD_LOAD_TIMEOUT = 45
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Cluster listings are also written to disk, so a restarted worker can serve
+# its first requests from the last listing instead of waiting for kubectl
+PERSIST_DIR = os.path.abspath('instance/snapshots')
+PERSISTED_KEYS = ("namespaces", "all_pods")
+PERSIST_SNAPSHOTS = env_flag("AGNOSTER_SNAPSHOT_PERSIST", True)
+MAX_WARM_AGE = 24 * 3600  # Seconds; older files are ignored at startup
+# Seconds between writes of one key's file, across all workers
+PERSIST_INTERVAL = float(os.environ.get("AGNOSTER_SNAPSHOT_PERSIST_INTERVAL", "60"))
+
+# Snapshot file: magic, header length, JSON header, then the JSON body as
+# served fresh; the stale flag is added when the file is loaded
+FILE_MAGIC = b"AGNSNAP2"
+FILE_PREFIX = struct.Struct("<8sI")
+
+
+def dumps(payload):
+    """Serialize a payload to compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def loads(body):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class Snapshot:
+    """One serialized version of an API payload plus its compressed variants.
+
+    Bodies are encoded once and shared by every client until the payload
+    changes, so serving a poll is a dictionary lookup.
+    """
+
+    def __init__(self, payload, stale=False, body=None, version=None):
+        self._payload = payload
+        self.stale = stale
+        # Loaded from disk at startup and not refreshed yet
+        self.warm = False
+        self.created = time.monotonic()
+        raw = body if body is not None else dumps(payload)
+        self.version = version or hashlib.sha1(raw).hexdigest()[:16]
+        self._bodies = {"identity": raw}
+        self._lock = threading.Lock()
+        self._stale_copy = None
+
+    @property
+    def payload(self):
+        # Snapshots loaded from disk only parse their body when it is first needed
+        if self._payload is None:
+            self._payload = loads(self._bodies["identity"])
+        return self._payload
+
+    def as_stale(self):
+        """Return a copy of this snapshot whose payload is flagged as stale."""
+        if self.stale:
+            return self
+        if self._stale_copy is None:
+            payload = dict(self.payload, stale=True,
+                           stale_since=datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
+            self._stale_copy = Snapshot(payload, stale=True)
+        return self._stale_copy
+
+    def body(self, encoding):
+        """Return the body for an encoding, compressing it on first use."""
+        body = self._bodies.get(encoding)
+        if body is not None:
+            return body
+
+        with self._lock:
+            body = self._bodies.get(encoding)
+            if body is None:
+                raw = self._bodies["identity"]
+                if encoding == "br":
+                    body = brotli.compress(raw, quality=BROTLI_QUALITY)
+                elif encoding == "gzip":
+                    body = gzip.compress(raw, compresslevel=GZIP_LEVEL)
+                else:
+                    raise ValueError(f"Unsupported encoding: {encoding}")
+                self._bodies[encoding] = body
+        return body
+
+
+class SnapshotCache:
+    """Per-process cache of API snapshots keyed by name."""
+
+    def __init__(self, ttl=SNAPSHOT_TTL, persist_dir=None, persisted_keys=()):
+        self.ttl = ttl
+        self.persist_dir = persist_dir
+        self.persisted_keys = persisted_keys
+        self._snapshots = {}
+        self._locks = {}
+        self._refreshing = set()
+        self._loading_since = {}
+        self._persisted_at = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, loader):
+        """Return a fresh snapshot for key, calling loader() when it expired.
+
+        Only one caller per key runs the loader. While it does, concurrent
+        callers get the previous snapshot instead of queueing behind it,
+        flagged as stale once the refresh has taken longer than
+        REFRESH_GRACE; callers only wait when there is nothing to serve yet.
+        If the loader fails and an earlier snapshot exists, that snapshot is
+        served again, flagged as stale, until a later refresh succeeds.
+
+        A snapshot loaded from disk at startup is returned right away, still
+        flagged as stale, while a background thread fetches a fresh one.
+        """
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.warm:
+            self._refresh_in_background(key, loader, snapshot)
+            return snapshot
+        if snapshot is not None and time.monotonic() - snapshot.created < self.ttl:
+            return snapshot
+
+        lock = self._key_lock(key)
+        if snapshot is not None:
+            if not lock.acquire(blocking=False):
+                # Another caller is refreshing this key
+                loading_since = self._loading_since.get(key)
+                if loading_since is not None and time.monotonic() - loading_since > REFRESH_GRACE:
+                    return snapshot.as_stale()
+                return snapshot
+        elif not lock.acquire(timeout=COLD_LOAD_TIMEOUT):
+            raise TimeoutError(f"Timed out waiting for the first {key} listing")
+
+        try:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and time.monotonic() - snapshot.created < self.ttl:
+                return snapshot
+
+            self._loading_since[key] = time.monotonic()
+            try:
+                payload = loader()
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                logger.warning(f"Refreshing snapshot {key} failed, serving last good data: {str(e)}")
+                stale_snapshot = snapshot.as_stale()
+                # Retry the loader only after another TTL has passed
+                stale_snapshot.created = time.monotonic()
+                self._snapshots[key] = stale_snapshot
+                return stale_snapshot
+            finally:
+                self._loading_since.pop(key, None)
+            return self.publish(key, payload)
+        finally:
+            lock.release()
+
+    def _refresh_in_background(self, key, loader, warm_snapshot):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self.publish(key, loader())
+                # Snapshots derived from the warm data (e.g. the summary) are rebuilt next time
+                for other in list(self._snapshots):
+                    if other not in self.persisted_keys:
+                        self.invalidate(other)
+                logger.info(f"Replaced warm snapshot {key} with a fresh listing")
+            except Exception as e:
+                logger.warning(f"Refreshing warm snapshot {key} failed: {str(e)}")
+                # Keep serving it, but retry on the normal TTL schedule
+                warm_snapshot.warm = False
+                warm_snapshot.created = time.monotonic()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def publish(self, key, payload):
+        """Store a new payload for key, keeping the old bodies if unchanged."""
+        new_snapshot = Snapshot(payload)
+        old_snapshot = self._snapshots.get(key)
+        if old_snapshot is not None and old_snapshot.version == new_snapshot.version:
+            # Same bytes: keep the compressed variants that were already built
+            old_snapshot.created = new_snapshot.created
+            return old_snapshot
+
+        self._snapshots[key] = new_snapshot
+        logger.debug(f"Published snapshot {key} version {new_snapshot.version}")
+        if self.persist_dir and key in self.persisted_keys:
+            self._schedule_persist(key, new_snapshot)
+        return new_snapshot
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.snap")
+
+    def _schedule_persist(self, key, snapshot):
+        """Write a snapshot to disk in the background, at most once per PERSIST_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            last = self._persisted_at.get(key)
+            if last is not None and now - last < PERSIST_INTERVAL:
+                return
+            self._persisted_at[key] = now
+        threading.Thread(target=self._persist, args=(key, snapshot), daemon=True).start()
+
+    def _persist(self, key, snapshot):
+        """Write a snapshot's already-encoded body to disk unless another worker just did."""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) < PERSIST_INTERVAL:
+                return
+        except OSError:
+            pass
+
+        header = dumps({
+            "key": key,
+            "version": snapshot.version,
+            "saved_at": time.time(),
+        })
+        body = snapshot.body("identity")
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(FILE_PREFIX.pack(FILE_MAGIC, len(header)))
+                f.write(header)
+                f.write(body)
+            # Atomic, so workers starting up never read a half-written file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist snapshot {key}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _read(self, path):
+        """Return (header, body) from a snapshot file."""
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, header_length = FILE_PREFIX.unpack_from(data, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError("not a snapshot file")
+        offset = FILE_PREFIX.size + header_length
+        header = loads(data[FILE_PREFIX.size:offset])
+        body = data[offset:]
+        if not (body.startswith(b"{") and body.endswith(b"}")):
+            raise ValueError("body is not a JSON object")
+        return header, body
+
+    @staticmethod
+    def _flag_stale(body, saved_at):
+        """Add stale and stale_since to a serialized JSON object without parsing it."""
+        stale_since = datetime.utcfromtimestamp(saved_at).strftime("%Y-%m-%dT%H:%M:%SZ")
+        # Appended last, so they win over any stale key already in the body
+        flags = f'"stale":true,"stale_since":"{stale_since}"}}'.encode("utf-8")
+        return body[:-1] + (flags if body == b"{}" else b"," + flags)
+
+    def load_persisted(self):
+        """Load the snapshots saved by earlier processes, marked warm and stale."""
+        if not self.persist_dir:
+            return
+        for key in self.persisted_keys:
+            path = self._path(key)
+            if key in self._snapshots or not os.path.exists(path):
+                continue
+            try:
+                header, body = self._read(path)
+                if not isinstance(header, dict):
+                    raise ValueError("header is not an object")
+                if not isinstance(header.get("saved_at"), (int, float)) or not isinstance(header.get("version"), str):
+                    raise ValueError("header lacks saved_at or version")
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Ignoring unreadable snapshot file {path}: {str(e)}")
+                continue
+            age = time.time() - header["saved_at"]
+            if header.get("key") != key or age > MAX_WARM_AGE:
+                continue
+            snapshot = Snapshot(None, stale=True, body=self._flag_stale(body, header["saved_at"]))
+            snapshot.warm = True
+            self._snapshots[key] = snapshot
+            logger.info(f"Loaded warm snapshot {key} ({len(body)} bytes, {age:.0f}s old)")
+
+    def invalidate(self, key=None):
+        """Drop one snapshot, or all of them when no key is given."""
+        if key is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(key, None)
+
+
+snapshots = SnapshotCache(
+    persist_dir=PERSIST_DIR if PERSIST_SNAPSHOTS else None,
+    persisted_keys=PERSISTED_KEYS
+)
+
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported encoding from a werkzeug Accept-Encoding header."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def snapshot_response(snapshot, request):
+    """Build a response for a snapshot, honoring If-None-Match and Accept-Encoding.
+
+    The ETag is a strong validator, so each content-coding gets its own:
+    a cache must never answer an identity client's revalidation with a
+    gzip body it stored under the same tag.
+    """
+    encoding = choose_encoding(request.accept_encodings)
+    etag = snapshot.version if encoding == "identity" else f"{snapshot.version}-{encoding}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.body(encoding), mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    # Revalidate every poll so clients pick up new versions immediately
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from collections import deque
+from sqlalchemy import event
+from env_utils import env_flag
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Applied to every new SQLite connection; see configure_sqlite()
+SQLITE_WAL = env_flag("AGNOSTER_SQLITE_WAL", True)
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("AGNOSTER_SQLITE_BUSY_TIMEOUT", "5000"))  # Milliseconds
+SQLITE_SYNCHRONOUS = os.environ.get("AGNOSTER_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Statements that never write; anything else takes the writer slot
+READ_STATEMENTS = ("SELECT", "PRAGMA", "EXPLAIN")
+
+_HOLDS_WRITER = "agnoster_holds_writer"
+
+
+class WriterQueue:
+    """First-come, first-served lock that admits one writing transaction at a time.
+
+    SQLite allows a single writer per database. Letting threads queue here,
+    in order, keeps them from all spinning on the database lock at once and
+    keeps a busy monitor tick from starving request writes.
+    """
+
+    def __init__(self):
+        self._waiting = deque()
+        self._holder = None
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            granted = self._condition.wait_for(
+                lambda: self._holder is None and self._waiting[0] is ticket, timeout
+            )
+            if not granted:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+                raise TimeoutError(f"Waited more than {timeout:g}s for the SQLite writer slot")
+            self._waiting.popleft()
+            self._holder = ticket
+
+    def release(self):
+        with self._condition:
+            self._holder = None
+            self._condition.notify_all()
+
+
+writer_queue = WriterQueue()
+
+
+def _release(info):
+    if info.pop(_HOLDS_WRITER, False):
+        writer_queue.release()
+
+
+def configure_sqlite(engine):
+    """Tune an SQLite engine for several workers and threads.
+
+    On connect: WAL journaling, so readers never block the writer or each
+    other; a busy timeout, so a writer in another process is waited for
+    instead of failing with "database is locked"; and synchronous=NORMAL,
+    which is durable across application crashes in WAL mode.
+
+    Within a process, the first write of a transaction waits its turn in
+    writer_queue and the slot is released on commit or rollback, so
+    mutations from the monitor, job workers and requests run one at a time.
+    """
+    synchronous = SQLITE_SYNCHRONOUS if SQLITE_SYNCHRONOUS in SYNCHRONOUS_MODES else "NORMAL"
+    writer_timeout = SQLITE_BUSY_TIMEOUT / 1000
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def claim_writer(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get(_HOLDS_WRITER):
+            return
+        if statement.lstrip()[:7].upper().startswith(READ_STATEMENTS):
+            return
+        writer_queue.acquire(writer_timeout)
+        conn.info[_HOLDS_WRITER] = True
+
+    @event.listens_for(engine, "commit")
+    @event.listens_for(engine, "rollback")
+    def release_writer(conn):
+        _release(conn.info)
+
+    # Connections returned to the pool or discarded mid-transaction
+    @event.listens_for(engine.pool, "reset")
+    def release_on_reset(dbapi_connection, connection_record, reset_state):
+        if connection_record is not None:
+            _release(connection_record.info)
+
+    @event.listens_for(engine.pool, "invalidate")
+    @event.listens_for(engine.pool, "close")
+    def release_on_discard(dbapi_connection, connection_record, *args):
+        if connection_record is not None:
+            _release(connection_record.info)
+
+    logger.info(f"SQLite tuned: journal_mode={'WAL' if SQLITE_WAL else 'default'}, "
+                f"busy_timeout={SQLITE_BUSY_TIMEOUT}ms, synchronous={synchronous}")
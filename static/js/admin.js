@@ -35,6 +35,8 @@ document.addEventListener('DOMContentLoaded', function() {
       if (configForm && configData) {
         configForm.querySelector('#shutdown_threshold').value = configData.shutdown_threshold || 14;
         configForm.querySelector('#monitoring_interval').value = configData.monitoring_interval || 5;
+        configForm.querySelector('#shutdown_policy').value = configData.shutdown_policy || 'runtime';
+        configForm.querySelector('#idle_hours').value = configData.idle_hours || 2;
       }
       
       // Initialize blacklist
@@ -217,8 +219,10 @@ document.addEventListener('DOMContentLoaded', function() {
         
         const shutdownThreshold = parseInt(configForm.querySelector('#shutdown_threshold').value);
         const monitoringInterval = parseInt(configForm.querySelector('#monitoring_interval').value);
+        const shutdownPolicy = configForm.querySelector('#shutdown_policy').value;
+        const idleHours = parseFloat(configForm.querySelector('#idle_hours').value);
         
-        if (isNaN(shutdownThreshold) || isNaN(monitoringInterval)) {
+        if (isNaN(shutdownThreshold) || isNaN(monitoringInterval) || isNaN(idleHours)) {
           Utils.showToast('Please enter valid numbers for all fields', 'error');
           return;
         }
@@ -226,7 +230,9 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
           await ApiClient.updateConfig({
             shutdown_threshold: shutdownThreshold,
-            monitoring_interval: monitoringInterval
+            monitoring_interval: monitoringInterval,
+            shutdown_policy: shutdownPolicy,
+            idle_hours: idleHours
           });
           
           Utils.showToast('Configuration updated successfully', 'success');
@@ -10,12 +10,21 @@ document.addEventListener('DOMContentLoaded', function() {
   const loadingIndicator = document.getElementById('loading-indicator');
   
   // State
-  let namespaces = [];
-  let pods = [];
+  let summary = null;
+  let sampleData = null;
   let usingSampleData = false;
-  let config = {
-    shutdown_threshold: 14 // Default threshold in hours
-  };
+  let namespaceStore = null;
+  
+  // Rendered cards by namespace name: { element, signature }. Only cards in
+  // the visible window are kept; everything else exists only in the store.
+  const renderedCards = new Map();
+  
+  // Windowed rendering kicks in above this many namespaces
+  const VIRTUALIZE_AFTER = 60;
+  // Extra rows rendered above and below the viewport
+  const OVERSCAN_ROWS = 2;
+  let cardRowHeight = 0;
+  let renderScheduled = false;
   
   // Icons
   const icons = {
@@ -35,20 +44,11 @@ document.addEventListener('DOMContentLoaded', function() {
       let backendConnected = false;
       
       try {
-        // Try to fetch data from the backend
-        const [namespacesResponse, podsResponse, configData] = await Promise.all([
-          ApiClient.getNamespaces(),
-          ApiClient.getAllPods(),
-          ApiClient.getConfig().catch(() => ({ shutdown_threshold: 14 }))
-        ]);
+        // Fetch precomputed aggregates; the full pod list isn't needed to paint
+        summary = await ApiClient.getSummary();
         
         // Check if we're in demo mode
-        usingSampleData = namespacesResponse.demo_mode || false;
-        
-        // Extract actual data from responses
-        namespaces = namespacesResponse.data || namespacesResponse;
-        pods = podsResponse.data || podsResponse;
-        config = configData;
+        usingSampleData = summary.demo_mode || false;
         
         // Backend connection successful
         backendConnected = true;
@@ -59,7 +59,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Demo mode should be handled correctly by the backend
         usingSampleData = true;
         
-        namespaces = [
+        const namespaces = [
           {
             name: "IAmNameSpace",
             status: "Active",
@@ -86,7 +86,7 @@ document.addEventListener('DOMContentLoaded', function() {
           }
         ];
         
-        pods = [
+        const pods = [
           // IAmNameSpace pods
           {
             namespace: "IAmNameSpace",
@@ -152,10 +152,8 @@ document.addEventListener('DOMContentLoaded', function() {
           }
         ];
         
-        config = {
-          shutdown_threshold: 14,
-          monitoring_interval: 5
-        };
+        sampleData = { namespaces, pods };
+        summary = summarizeSampleData();
         
         // Show message about sample data
         Utils.showToast('Using sample data since backend connection failed. This is for demonstration purposes only.', 'info', 5000);
@@ -187,6 +185,8 @@ document.addEventListener('DOMContentLoaded', function() {
   // Show error message
   function showError(message) {
     if (dashboardContent) {
+      namespaceStore = null;
+      renderedCards.clear();
       dashboardContent.innerHTML = `
         <div class="shadcn-alert shadcn-alert-destructive">
           <div class="shadcn-alert-icon">${icons.warning}</div>
@@ -199,6 +199,37 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
 
+  // Build the /api/summary shape from the fallback sample data
+  function summarizeSampleData(threshold = 14) {
+    const { namespaces, pods } = sampleData;
+    
+    return {
+      shutdown_threshold: threshold,
+      totals: {
+        namespaces: namespaces.length,
+        active_namespaces: namespaces.filter(ns => ns.status === 'Active').length,
+        pods: pods.length,
+        long_running_pods: pods.filter(pod => pod.runtime_hours > threshold).length
+      },
+      namespaces: namespaces.map(namespace => {
+        const topPods = pods
+          .filter(pod => pod.namespace === namespace.name)
+          .sort((a, b) => b.runtime_hours - a.runtime_hours);
+        const maxRuntime = topPods.length > 0 ? topPods[0].runtime_hours : 0;
+        
+        return {
+          name: namespace.name,
+          status: namespace.status,
+          created_at: namespace.created_at,
+          pod_count: topPods.length,
+          max_runtime_hours: maxRuntime,
+          over_threshold: maxRuntime > threshold,
+          top_pods: topPods.slice(0, 3)
+        };
+      })
+    };
+  }
+  
   // Update statistics
   function updateStats() {
     if (namespaceStats && podStats) {
@@ -221,12 +252,26 @@ document.addEventListener('DOMContentLoaded', function() {
         }
       }
       
-      const totalNamespaces = namespaces.length;
-      const activeNamespaces = namespaces.filter(ns => ns.status === 'Active').length;
+      // Show a notice while the server is serving its last good cluster data
+      let staleDataNotice = document.querySelector('.stale-data-notice');
+      if (dashboardHeader && summary.stale && !staleDataNotice) {
+        staleDataNotice = document.createElement('div');
+        staleDataNotice.className = 'sample-data-notice stale-data-notice';
+        staleDataNotice.innerHTML = `
+          ${icons.warning}
+          <span><strong>Cluster Unreachable:</strong> The Kubernetes API is not responding. Showing the last data received.</span>
+        `;
+        dashboardHeader.insertAdjacentElement('afterend', staleDataNotice);
+      } else if (staleDataNotice && !summary.stale) {
+        staleDataNotice.remove();
+      }
+      
+      const totalNamespaces = summary.totals.namespaces;
+      const activeNamespaces = summary.totals.active_namespaces;
       
-      const totalPods = pods.length;
-      const runtimeThreshold = config.shutdown_threshold || 14;
-      const longRunningPods = pods.filter(pod => pod.runtime_hours > runtimeThreshold).length;
+      const totalPods = summary.totals.pods;
+      const runtimeThreshold = summary.shutdown_threshold || 14;
+      const longRunningPods = summary.totals.long_running_pods;
       
       namespaceStats.innerHTML = `
         <div class="stat-card card">
@@ -253,179 +298,312 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
   
-  // Render dashboard content
-  function renderDashboard() {
-    if (!dashboardContent) return;
-    
-    // Group pods by namespace
-    const podsByNamespace = pods.reduce((acc, pod) => {
-      const namespace = pod.namespace;
-      if (!acc[namespace]) {
-        acc[namespace] = [];
-      }
-      acc[namespace].push(pod);
-      return acc;
-    }, {});
+  // Convert summary.namespaces into a columnar store. Plain parallel arrays
+  // and typed arrays keep tens of thousands of namespaces cheap to hold and
+  // to compare between refreshes; each row's signature changes only when
+  // something shown on its card does.
+  function buildNamespaceStore(namespaces) {
+    const length = namespaces.length;
+    const store = {
+      length,
+      names: new Array(length),
+      statuses: new Array(length),
+      createdAt: new Array(length),
+      podCounts: new Uint32Array(length),
+      maxRuntimes: new Float64Array(length),
+      overThreshold: new Uint8Array(length),
+      topPods: new Array(length),
+      signatures: new Array(length)
+    };
     
-    // Render namespace cards
-    const cards = namespaces.map(namespace => {
-      const namespacePods = podsByNamespace[namespace.name] || [];
-      const longestRunningPod = namespacePods.length > 0 
-        ? namespacePods.reduce((prev, current) => 
-            (prev.runtime_hours > current.runtime_hours) ? prev : current
-          ) 
-        : null;
-      
-      const statusBadgeClass = namespace.status === 'Active' ? 'active' : 'pending';
-      
-      // Sort pods by runtime (longest first)
-      const sortedPods = [...namespacePods].sort((a, b) => b.runtime_hours - a.runtime_hours);
+    namespaces.forEach((namespace, i) => {
+      // Top pods arrive sorted by runtime (longest first)
+      const topPods = namespace.top_pods.map(pod => [pod.name, pod.runtime_hours]);
       
-      // Take top 3 pods to show
-      const topPods = sortedPods.slice(0, 3);
-      
-      const hasLongRunningPods = namespacePods.some(pod => pod.runtime_hours > config.shutdown_threshold);
-      
-      return `
-        <div class="namespace-card card" data-namespace="${namespace.name}">
-          <div class="namespace-header">
-            <div class="namespace-title">
-              <h3 class="namespace-name">${namespace.name}</h3>
-              <div class="namespace-status">
-                <span class="status-badge ${statusBadgeClass}">${namespace.status}</span>
-                ${hasLongRunningPods ? `<span class="status-badge pending">${icons.warning} Warning</span>` : ''}
-              </div>
-            </div>
+      store.names[i] = namespace.name;
+      store.statuses[i] = namespace.status;
+      store.createdAt[i] = namespace.created_at;
+      store.podCounts[i] = namespace.pod_count;
+      store.maxRuntimes[i] = namespace.max_runtime_hours;
+      store.overThreshold[i] = namespace.over_threshold ? 1 : 0;
+      store.topPods[i] = topPods;
+      store.signatures[i] = [
+        namespace.status, namespace.created_at, namespace.pod_count,
+        namespace.max_runtime_hours, store.overThreshold[i], topPods.join(';')
+      ].join('|');
+    });
+    
+    return store;
+  }
+  
+  // Inner HTML of one namespace card
+  function renderCardContent(store, i) {
+    const name = store.names[i];
+    const status = store.statuses[i];
+    const statusBadgeClass = status === 'Active' ? 'active' : 'pending';
+    const topPods = store.topPods[i];
+    
+    return `
+      <div class="namespace-header">
+        <div class="namespace-title">
+          <h3 class="namespace-name">${name}</h3>
+          <div class="namespace-status">
+            <span class="status-badge ${statusBadgeClass}">${status}</span>
+            ${store.overThreshold[i] ? `<span class="status-badge pending">${icons.warning} Warning</span>` : ''}
           </div>
-          
-          <div class="namespace-meta">
-            <div class="meta-item">
-              <span class="meta-label">Created:</span>
-              <span class="meta-value">${Utils.formatDate(namespace.created_at)}</span>
-            </div>
-            <div class="meta-item">
-              <span class="meta-label">Pod Count:</span>
-              <span class="meta-value">${namespace.pod_count}</span>
-            </div>
-            ${longestRunningPod ? `
-              <div class="meta-item">
-                <span class="meta-label">Longest Runtime:</span>
-                <span class="meta-value">${Utils.formatRuntime(longestRunningPod.runtime_hours)}</span>
-              </div>
-            ` : ''}
+        </div>
+      </div>
+      
+      <div class="namespace-meta">
+        <div class="meta-item">
+          <span class="meta-label">Created:</span>
+          <span class="meta-value">${Utils.formatDate(store.createdAt[i])}</span>
+        </div>
+        <div class="meta-item">
+          <span class="meta-label">Pod Count:</span>
+          <span class="meta-value">${store.podCounts[i]}</span>
+        </div>
+        ${store.podCounts[i] > 0 ? `
+          <div class="meta-item">
+            <span class="meta-label">Longest Runtime:</span>
+            <span class="meta-value">${Utils.formatRuntime(store.maxRuntimes[i])}</span>
           </div>
-          
-          ${topPods.length > 0 ? `
-            <div class="namespace-pods">
-              <h4 class="pod-title">Top Pods</h4>
-              <div class="pod-list">
-                ${topPods.map(pod => `
-                  <div class="pod-item">
-                    <span class="pod-name">${pod.name}</span>
-                    <span class="pod-runtime">${Utils.formatRuntime(pod.runtime_hours)}</span>
-                  </div>
-                `).join('')}
+        ` : ''}
+      </div>
+      
+      ${topPods.length > 0 ? `
+        <div class="namespace-pods">
+          <h4 class="pod-title">Top Pods</h4>
+          <div class="pod-list">
+            ${topPods.map(([podName, runtimeHours]) => `
+              <div class="pod-item">
+                <span class="pod-name">${podName}</span>
+                <span class="pod-runtime">${Utils.formatRuntime(runtimeHours)}</span>
               </div>
-            </div>
-          ` : ''}
-          
-          <div class="namespace-actions">
-            <button class="action-button start" data-action="start" data-namespace="${namespace.name}" title="Start namespace">
-              ${icons.play} Start
-            </button>
-            <button class="action-button stop" data-action="stop" data-namespace="${namespace.name}" title="Stop namespace">
-              ${icons.stop} Stop
-            </button>
-            <button class="action-button destroy" data-action="destroy" data-namespace="${namespace.name}" title="Permanently destroy namespace">
-              ${icons.destroy} Destroy
-            </button>
-            <button class="action-button reset" data-action="reset" data-namespace="${namespace.name}" title="Reset monitoring state">
-              ${icons.reset} Reset
-            </button>
+            `).join('')}
           </div>
         </div>
-      `;
-    }).join('');
-    
-    dashboardContent.innerHTML = cards || `
-      <div class="empty-state">
-        <p>No namespaces found. Namespaces on the blacklist are not shown.</p>
+      ` : ''}
+      
+      <div class="namespace-actions">
+        <button class="action-button start" data-action="start" data-namespace="${name}" title="Start namespace">
+          ${icons.play} Start
+        </button>
+        <button class="action-button stop" data-action="stop" data-namespace="${name}" title="Stop namespace">
+          ${icons.stop} Stop
+        </button>
+        <button class="action-button destroy" data-action="destroy" data-namespace="${name}" title="Permanently destroy namespace">
+          ${icons.destroy} Destroy
+        </button>
+        <button class="action-button reset" data-action="reset" data-namespace="${name}" title="Reset monitoring state">
+          ${icons.reset} Reset
+        </button>
       </div>
     `;
+  }
+  
+  // Return the card for row i, creating or patching it only if it changed
+  function cardFor(store, i) {
+    const name = store.names[i];
+    const signature = store.signatures[i];
+    let card = renderedCards.get(name);
+    
+    if (!card) {
+      const element = document.createElement('div');
+      element.className = 'namespace-card card';
+      element.setAttribute('data-namespace', name);
+      card = { element, signature: null };
+      renderedCards.set(name, card);
+    }
     
-    // Add event listeners to action buttons
-    attachActionButtonHandlers();
+    if (card.signature !== signature) {
+      card.element.innerHTML = renderCardContent(store, i);
+      card.signature = signature;
+    }
+    return card.element;
   }
   
-  // Attach event handlers to action buttons
-  function attachActionButtonHandlers() {
-    const actionButtons = document.querySelectorAll('.action-button');
+  // Work out which rows of the grid are on screen
+  function visibleRange(store) {
+    const virtualized = store.length > VIRTUALIZE_AFTER;
+    dashboardContent.classList.toggle('virtualized', virtualized);
+    if (!virtualized) {
+      return { start: 0, end: store.length, paddingTop: 0, paddingBottom: 0 };
+    }
     
-    actionButtons.forEach(button => {
-      button.addEventListener('click', async (e) => {
-        const action = button.getAttribute('data-action');
-        const namespace = button.getAttribute('data-namespace');
-        
-        if (!namespace || !action) return;
-        
-        // Different confirmation messages based on action
-        let confirmTitle, confirmMessage;
+    const style = getComputedStyle(dashboardContent);
+    const columns = Math.max(1, style.gridTemplateColumns.split(' ').length);
+    const rowGap = parseFloat(style.rowGap) || 0;
+    // Until a card has been measured, assume a fully populated one
+    const rowStride = (cardRowHeight || 380) + rowGap;
+    const totalRows = Math.ceil(store.length / columns);
+    
+    const contentTop = dashboardContent.getBoundingClientRect().top + window.scrollY;
+    const viewTop = window.scrollY - contentTop;
+    const firstRow = Math.max(0, Math.floor(viewTop / rowStride) - OVERSCAN_ROWS);
+    const lastRow = Math.min(totalRows - 1, Math.ceil((viewTop + window.innerHeight) / rowStride) + OVERSCAN_ROWS);
+    
+    return {
+      start: firstRow * columns,
+      end: Math.min(store.length, (lastRow + 1) * columns),
+      paddingTop: firstRow * rowStride,
+      paddingBottom: Math.max(0, totalRows - lastRow - 1) * rowStride
+    };
+  }
+  
+  // Render dashboard content
+  function renderDashboard() {
+    if (!dashboardContent) return;
+    
+    namespaceStore = buildNamespaceStore(summary.namespaces);
+    renderWindow();
+  }
+  
+  // Patch the DOM so it holds exactly the cards in the visible window
+  function renderWindow() {
+    const store = namespaceStore;
+    if (!store) return;
+    
+    if (store.length === 0) {
+      renderedCards.clear();
+      dashboardContent.classList.remove('virtualized');
+      dashboardContent.style.paddingTop = '';
+      dashboardContent.style.paddingBottom = '';
+      dashboardContent.innerHTML = `
+        <div class="empty-state">
+          <p>No namespaces found. Namespaces on the blacklist are not shown.</p>
+        </div>
+      `;
+      return;
+    }
+    
+    const range = visibleRange(store);
+    const wanted = new Set();
+    const elements = [];
+    for (let i = range.start; i < range.end; i++) {
+      wanted.add(store.names[i]);
+      elements.push(cardFor(store, i));
+    }
+    
+    // Forget cards that scrolled out of the window or disappeared
+    for (const [name, card] of renderedCards) {
+      if (!wanted.has(name)) {
+        card.element.remove();
+        renderedCards.delete(name);
+      }
+    }
+    
+    // Drop anything that isn't a card (empty state, error message)
+    for (const child of Array.from(dashboardContent.children)) {
+      if (!child.classList.contains('namespace-card')) {
+        child.remove();
+      }
+    }
+    
+    // Move or insert only the cards that are not already in place
+    elements.forEach((element, position) => {
+      const current = dashboardContent.children[position];
+      if (current !== element) {
+        dashboardContent.insertBefore(element, current || null);
+      }
+    });
+    
+    dashboardContent.style.paddingTop = range.paddingTop ? `${range.paddingTop}px` : '';
+    dashboardContent.style.paddingBottom = range.paddingBottom ? `${range.paddingBottom}px` : '';
+    
+    // Virtualized rows share one height; grow it to fit the tallest card seen
+    if (dashboardContent.classList.contains('virtualized')) {
+      const tallest = elements.reduce((height, element) => Math.max(height, element.scrollHeight), 0);
+      if (tallest > cardRowHeight) {
+        cardRowHeight = tallest;
+        dashboardContent.style.setProperty('--card-row-height', `${cardRowHeight}px`);
+        scheduleRenderWindow();
+      }
+    }
+  }
+  
+  // Re-render the window at most once per animation frame
+  function scheduleRenderWindow() {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(() => {
+      renderScheduled = false;
+      renderWindow();
+    });
+  }
+  
+  // One delegated handler serves every card, including ones created later
+  function handleActionClick(e) {
+    const button = e.target.closest('.action-button');
+    if (!button || !dashboardContent.contains(button)) return;
+    
+    const action = button.getAttribute('data-action');
+    const namespace = button.getAttribute('data-namespace');
+    
+    if (!namespace || !action) return;
+    
+    // Different confirmation messages based on action
+    let confirmTitle, confirmMessage;
+    
+    switch (action) {
+      case 'start':
+        confirmTitle = 'Start Namespace';
+        confirmMessage = `Are you sure you want to start the namespace "${namespace}"?`;
+        break;
+      case 'stop':
+        confirmTitle = 'Stop Namespace';
+        confirmMessage = `Are you sure you want to stop the namespace "${namespace}"? This will stop all running pods.`;
+        break;
+      case 'destroy':
+        confirmTitle = 'Destroy Namespace';
+        confirmMessage = `Are you sure you want to destroy the namespace "${namespace}"? This action is irreversible and will permanently delete all resources in this namespace.`;
+        break;
+      case 'reset':
+        confirmTitle = 'Reset Namespace Monitoring';
+        confirmMessage = `Are you sure you want to reset the monitoring state for namespace "${namespace}"?`;
+        break;
+      default:
+        return;
+    }
+    
+    // Show confirmation dialog
+    Utils.confirmDialog(confirmTitle, confirmMessage, async () => {
+      try {
+        showLoading(true);
         
+        let result;
         switch (action) {
           case 'start':
-            confirmTitle = 'Start Namespace';
-            confirmMessage = `Are you sure you want to start the namespace "${namespace}"?`;
+            result = await ApiClient.startNamespace(namespace);
             break;
           case 'stop':
-            confirmTitle = 'Stop Namespace';
-            confirmMessage = `Are you sure you want to stop the namespace "${namespace}"? This will stop all running pods.`;
+            result = await ApiClient.stopNamespace(namespace);
             break;
           case 'destroy':
-            confirmTitle = 'Destroy Namespace';
-            confirmMessage = `Are you sure you want to destroy the namespace "${namespace}"? This action is irreversible and will permanently delete all resources in this namespace.`;
+            result = await ApiClient.destroyNamespace(namespace);
             break;
           case 'reset':
-            confirmTitle = 'Reset Namespace Monitoring';
-            confirmMessage = `Are you sure you want to reset the monitoring state for namespace "${namespace}"?`;
+            result = await ApiClient.resetNamespace(namespace);
             break;
-          default:
-            return;
         }
         
-        // Show confirmation dialog
-        Utils.confirmDialog(confirmTitle, confirmMessage, async () => {
-          try {
-            showLoading(true);
-            
-            let result;
-            switch (action) {
-              case 'start':
-                result = await ApiClient.startNamespace(namespace);
-                break;
-              case 'stop':
-                result = await ApiClient.stopNamespace(namespace);
-                break;
-              case 'destroy':
-                result = await ApiClient.destroyNamespace(namespace);
-                break;
-              case 'reset':
-                result = await ApiClient.resetNamespace(namespace);
-                break;
-            }
-            
-            // Show success message
-            Utils.showToast(result.message || `${action} operation successful`, 'success');
-            
-            // Refresh data after a short delay
-            setTimeout(refreshData, 1000);
-          } catch (error) {
-            console.error(`Failed to ${action} namespace:`, error);
-            Utils.showToast(`Failed to ${action} namespace: ${error.message}`, 'error');
-          } finally {
-            showLoading(false);
-          }
-        });
-      });
+        // The action runs as a background job; report it once it finishes
+        Utils.showToast(result.message || `${action} queued`, 'info');
+        showLoading(false);
+        
+        const job = await ApiClient.waitForJob(result.job_id);
+        if (job.status === 'failed') {
+          throw new Error(job.error || 'Job failed');
+        }
+        Utils.showToast(`${action} of namespace ${namespace} finished`, 'success');
+        
+        refreshData();
+      } catch (error) {
+        console.error(`Failed to ${action} namespace:`, error);
+        Utils.showToast(`Failed to ${action} namespace: ${error.message}`, 'error');
+      } finally {
+        showLoading(false);
+      }
     });
   }
   
@@ -433,32 +611,26 @@ document.addEventListener('DOMContentLoaded', function() {
   async function refreshData() {
     try {
       try {
-        // Try to fetch updated data from the backend
-        const [namespacesResponse, podsResponse] = await Promise.all([
-          ApiClient.getNamespaces(),
-          ApiClient.getAllPods()
-        ]);
+        // Try to fetch updated aggregates from the backend
+        summary = await ApiClient.getSummary();
         
         // Check if we're in demo mode
-        usingSampleData = namespacesResponse.demo_mode || false;
-        
-        // Extract data from responses
-        namespaces = namespacesResponse.data || namespacesResponse;
-        pods = podsResponse.data || podsResponse;
+        usingSampleData = summary.demo_mode || false;
       } catch (error) {
         console.error('Failed to refresh data from backend:', error);
         
         // If connection fails but we already have data, just update it
         // This simulates time passing when connection is lost
-        if (namespaces && namespaces.length > 0 && pods && pods.length > 0) {
+        if (sampleData && sampleData.pods.length > 0) {
           // Set the sample data flag to true when connection fails
           usingSampleData = true;
           
           // Update pod runtimes to simulate time passing
-          pods.forEach(pod => {
+          sampleData.pods.forEach(pod => {
             pod.runtime_hours += Math.random() * 0.1; // Add up to 0.1 hours (6 minutes)
             pod.runtime_hours = parseFloat(pod.runtime_hours.toFixed(2)); // Format to 2 decimal places
           });
+          summary = summarizeSampleData();
         }
       }
       
@@ -476,6 +648,12 @@ document.addEventListener('DOMContentLoaded', function() {
     setInterval(refreshData, 5000);
   }
   
+  if (dashboardContent) {
+    dashboardContent.addEventListener('click', handleActionClick);
+  }
+  window.addEventListener('scroll', scheduleRenderWindow, { passive: true });
+  window.addEventListener('resize', scheduleRenderWindow);
+  
   // Initialize dashboard when DOM is loaded
   initializeDashboard();
 });
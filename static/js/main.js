@@ -282,6 +282,14 @@ const ApiClient = {
     }
   },
   
+  /**
+   * Get precomputed dashboard aggregates
+   * @returns {Promise<Object>} Summary with totals, per-namespace stats and demo mode flag
+   */
+  async getSummary() {
+    return this.fetch('/api/summary');
+  },
+  
   /**
    * Get all namespaces
    * @returns {Promise<Object>} Response with namespaces and demo mode flag
@@ -351,6 +359,31 @@ const ApiClient = {
     });
   },
   
+  /**
+   * Get a background job
+   * @param {string} jobId - Job ID returned by a namespace action
+   * @returns {Promise<Object>} Job with status, result and error
+   */
+  async getJob(jobId) {
+    return this.fetch(`/api/jobs/${jobId}`);
+  },
+  
+  /**
+   * Poll a background job until it has finished
+   * @param {string} jobId - Job ID returned by a namespace action
+   * @param {number} interval - Milliseconds between polls
+   * @returns {Promise<Object>} The finished job
+   */
+  async waitForJob(jobId, interval = 1000) {
+    while (true) {
+      const job = await this.getJob(jobId);
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, interval));
+    }
+  },
+  
   /**
    * Get configuration
    * @returns {Promise<Object>} Configuration
@@ -0,0 +1,91 @@
+import json
+import os
+
+import pytest
+
+# Must be set before the app modules are imported
+FAKE_KUBECTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_kubectl.py")
+os.environ["AGNOSTER_KUBECTL"] = FAKE_KUBECTL
+os.environ["AGNOSTER_SNAPSHOT_PERSIST"] = "0"
+os.environ["AGNOSTER_JOB_WORKERS"] = "0"
+
+import kubernetes_utils  # noqa: E402
+from app import create_app, init_db  # noqa: E402
+from extensions import db  # noqa: E402
+from snapshot_utils import snapshots  # noqa: E402
+
+
+class FakeCluster:
+    """The state behind tests/fake_kubectl.py, read and written as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._save({"namespaces": {}, "failures": [], "unready": [], "calls": []})
+
+    def _load(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _save(self, state):
+        with open(self.path, "w") as f:
+            json.dump(state, f)
+
+    def _update(self, change):
+        state = self._load()
+        change(state)
+        self._save(state)
+
+    def add_namespace(self, namespace, workloads=None, pods=()):
+        """Add a namespace; workloads maps "deployment/web" -> replicas."""
+        self._update(lambda state: state["namespaces"].__setitem__(namespace, {
+            "workloads": dict(workloads or {}),
+            "pods": [{"name": name, "created_at": created_at} for name, created_at in pods]
+        }))
+
+    def set_replicas(self, namespace, resource, replicas):
+        self._update(lambda state: state["namespaces"][namespace]["workloads"].__setitem__(resource, replicas))
+
+    def replicas(self, namespace):
+        return self._load()["namespaces"][namespace]["workloads"]
+
+    def fail(self, match, stderr="Error from server (Forbidden): denied", sleep=0):
+        """Fail every call whose argv contains `match`."""
+        self._update(lambda state: state["failures"].append({"match": match, "stderr": stderr, "sleep": sleep}))
+
+    def heal(self):
+        self._update(lambda state: state["failures"].clear())
+
+    def never_ready(self, resource):
+        self._update(lambda state: state["unready"].append(resource))
+
+    @property
+    def calls(self):
+        return [" ".join(call) for call in self._load()["calls"]]
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    path = str(tmp_path / "cluster.json")
+    monkeypatch.setenv("FAKE_KUBECTL_STATE", path)
+    return FakeCluster(path)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, cluster):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'agnoster.db'}")
+    # A fresh breaker per test, so failures in one test can't open it for the next
+    monkeypatch.setattr(kubernetes_utils, "circuit_breaker", kubernetes_utils.CircuitBreaker(5, 30))
+    app = create_app()
+    with app.app_context():
+        init_db()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    snapshots.invalidate()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "admin"})
+    return client
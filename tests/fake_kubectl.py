@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""A stand-in for kubectl backed by a JSON file, for tests.
+
+Point AGNOSTER_KUBECTL at this script and FAKE_KUBECTL_STATE at a state
+file (see FakeCluster in conftest.py). It answers the commands Agnoster
+runs: listing namespaces, pods and workloads, scaling workloads and
+waiting for rollouts. Every call is appended to the state's "calls" list.
+
+Failures are injected with "failures" rules: any call whose argv, joined
+by spaces, contains a rule's "match" writes the rule's "stderr" and exits
+with status 1, after sleeping "sleep" seconds. Workloads named in
+"unready" never finish rolling out: `rollout status` waits for its
+--timeout and then fails the way kubectl does.
+"""
+import fcntl
+import json
+import os
+import sys
+import time
+
+
+def main(args):
+    state_path = os.environ["FAKE_KUBECTL_STATE"]
+    with open(f"{state_path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(state_path) as f:
+            state = json.load(f)
+        state["calls"].append(args)
+        output, error = run(state, args)
+        with open(state_path, "w") as f:
+            json.dump(state, f)
+
+    if isinstance(error, tuple):
+        delay, error = error
+        time.sleep(delay)
+    if error is not None:
+        sys.stderr.write(error + "\n")
+        return 1
+    sys.stdout.write(output)
+    return 0
+
+
+def option(args, name, default=None):
+    for i, arg in enumerate(args):
+        if arg == name:
+            return args[i + 1]
+        if arg.startswith(f"{name}="):
+            return arg.split("=", 1)[1]
+    return default
+
+
+def run(state, args):
+    command = " ".join(args)
+    for rule in state["failures"]:
+        if rule["match"] in command:
+            return None, (rule.get("sleep", 0), rule["stderr"])
+
+    namespaces = state["namespaces"]
+    if args[:2] == ["get", "namespaces"]:
+        return json.dumps({"items": [{
+            "metadata": {"name": name, "creationTimestamp": "2024-01-01T00:00:00Z"},
+            "status": {"phase": "Active"}
+        } for name in namespaces]}), None
+
+    if args[:2] == ["get", "pods"]:
+        return json.dumps({"items": [{
+            "metadata": {"name": pod["name"], "namespace": name, "creationTimestamp": pod["created_at"]},
+            "status": {"phase": "Running"}
+        } for name, namespace in namespaces.items() for pod in namespace["pods"]]}), None
+
+    if args[:2] == ["get", "deployments,statefulsets"]:
+        workloads = namespaces.get(option(args, "-n"), {}).get("workloads", {})
+        return json.dumps({"items": [{
+            "kind": {"deployment": "Deployment", "statefulset": "StatefulSet"}[resource.split("/")[0]],
+            "metadata": {"name": resource.split("/")[1]},
+            "spec": {"replicas": replicas}
+        } for resource, replicas in workloads.items()]}), None
+
+    if args[:2] == ["get", "--raw"]:
+        return json.dumps({"items": []}), None
+
+    if args[0] == "scale":
+        workloads = namespaces[option(args, "-n")]["workloads"]
+        replicas = int(option(args, "--replicas"))
+        resources = [arg for arg in args[1:] if "/" in arg]
+        missing = [resource for resource in resources if resource not in workloads]
+        if missing:
+            return None, f'Error from server (NotFound): {missing[0]} not found'
+        for resource in resources:
+            workloads[resource] = replicas
+        return "\n".join(f"{resource} scaled" for resource in resources), None
+
+    if args[:2] == ["rollout", "status"]:
+        resource = args[2]
+        if resource in state["unready"]:
+            timeout = float(option(args, "--timeout", "0s").rstrip("s"))
+            return None, (timeout, "error: timed out waiting for the condition")
+        return f'{resource} successfully rolled out', None
+
+    return None, f"error: unknown command {command!r}"
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,25 @@
+import pytest
+
+from env_utils import env_flag
+
+
+@pytest.mark.parametrize("value", ["1", "true", "YES", " On "])
+def test_true_values(monkeypatch, value):
+    monkeypatch.setenv("AGNOSTER_TEST_FLAG", value)
+    assert env_flag("AGNOSTER_TEST_FLAG", False) is True
+
+
+@pytest.mark.parametrize("value", ["0", "False", "no", "OFF"])
+def test_false_values(monkeypatch, value):
+    monkeypatch.setenv("AGNOSTER_TEST_FLAG", value)
+    assert env_flag("AGNOSTER_TEST_FLAG", True) is False
+
+
+@pytest.mark.parametrize("value", [None, "", "maybe"])
+def test_unset_empty_or_unknown_values_use_the_default(monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv("AGNOSTER_TEST_FLAG", raising=False)
+    else:
+        monkeypatch.setenv("AGNOSTER_TEST_FLAG", value)
+    assert env_flag("AGNOSTER_TEST_FLAG", True) is True
+    assert env_flag("AGNOSTER_TEST_FLAG", False) is False
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+import kubernetes_utils
+from kubernetes_utils import CircuitBreaker, ClusterUnavailableError, KubectlError, run_kubectl_command
+
+UNREACHABLE = "Unable to connect to the server: dial tcp 10.0.0.1:443: i/o timeout"
+LIST_NAMESPACES = ["kubectl", "get", "namespaces", "-o", "json"]
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    monkeypatch.setattr(kubernetes_utils, "circuit_breaker", breaker)
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL_RETRIES", 0)
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL_BACKOFF", 0.01)
+    return breaker
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_breaker_moves_from_open_to_half_open_to_closed(breaker):
+    open_breaker(breaker)
+    with pytest.raises(ClusterUnavailableError):
+        breaker.before_call()
+
+    time.sleep(breaker.reset_timeout)
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    # Only one trial call at a time
+    with pytest.raises(ClusterUnavailableError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_breaker(breaker):
+    open_breaker(breaker)
+    time.sleep(breaker.reset_timeout)
+    breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(ClusterUnavailableError):
+        breaker.before_call()
+
+
+def test_transient_failures_open_the_breaker_and_calls_fail_fast(breaker, cluster):
+    cluster.fail("get namespaces", stderr=UNREACHABLE)
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(KubectlError) as error:
+            run_kubectl_command(LIST_NAMESPACES)
+        assert error.value.transient
+    assert breaker.state == "open"
+
+    calls = len(cluster.calls)
+    with pytest.raises(ClusterUnavailableError):
+        run_kubectl_command(LIST_NAMESPACES)
+    assert len(cluster.calls) == calls
+
+    cluster.heal()
+    time.sleep(breaker.reset_timeout)
+    assert run_kubectl_command(LIST_NAMESPACES)
+    assert breaker.state == "closed"
+
+
+def test_transient_failures_are_retried(breaker, cluster, monkeypatch):
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL_RETRIES", 2)
+    breaker.failure_threshold = 10
+    cluster.fail("get namespaces", stderr=UNREACHABLE)
+
+    with pytest.raises(KubectlError):
+        run_kubectl_command(LIST_NAMESPACES)
+    assert len(cluster.calls) == 3
+    assert breaker.failures == 3
+
+
+def test_non_transient_errors_are_not_retried_and_keep_the_breaker_closed(breaker, cluster, monkeypatch):
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL_RETRIES", 2)
+    breaker.record_failure()
+    cluster.fail("get namespaces", stderr='Error from server (NotFound): namespaces "team-a" not found')
+
+    with pytest.raises(KubectlError) as error:
+        run_kubectl_command(LIST_NAMESPACES)
+    assert not error.value.transient
+    assert len(cluster.calls) == 1
+    # The API server answered, so the earlier failure streak is over
+    assert breaker.failures == 0
+    assert breaker.state == "closed"
+
+
+def test_retries_stop_at_the_deadline(breaker, cluster, monkeypatch):
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL_RETRIES", 10)
+    breaker.failure_threshold = 100
+    cluster.fail("get namespaces", stderr=UNREACHABLE, sleep=5)
+
+    started = time.monotonic()
+    with pytest.raises(KubectlError) as error:
+        run_kubectl_command(LIST_NAMESPACES, timeout=30, deadline=1)
+    assert time.monotonic() - started < 3
+    assert "timed out" in str(error.value)
+    assert error.value.transient
+
+
+def test_waiting_for_a_slot_does_not_touch_the_breaker(breaker, cluster):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    breaker.record_failure()
+
+    with pytest.raises(KubectlError) as error:
+        run_kubectl_command(LIST_NAMESPACES, deadline=0.2, slots=slots)
+    assert not isinstance(error.value, ClusterUnavailableError)
+    assert "slot" in str(error.value)
+    assert cluster.calls == []
+    assert breaker.failures == 1
+    assert breaker.state == "closed"
+
+
+def test_kubectl_that_cannot_start_ends_a_half_open_trial(breaker, cluster, monkeypatch):
+    monkeypatch.setattr(kubernetes_utils, "KUBECTL", "/nonexistent/kubectl")
+    open_breaker(breaker)
+    time.sleep(breaker.reset_timeout)
+
+    with pytest.raises(KubectlError) as error:
+        run_kubectl_command(LIST_NAMESPACES)
+    assert "Could not run kubectl" in str(error.value)
+    assert breaker.state == "open"
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from kubernetes_utils import (
+    BlacklistedNamespaceError, KubectlError,
+    start_namespace, stop_namespace
+)
+from models import ScaledWorkload
+
+WORKLOADS = {"deployment/web": 3, "deployment/api": 2, "statefulset/db": 1, "deployment/batch": 0}
+
+
+def saved_counts(namespace):
+    return {
+        f"{row.kind.lower()}/{row.name}": row.replicas
+        for row in ScaledWorkload.query.filter_by(namespace_name=namespace)
+    }
+
+
+def test_stop_then_start_restores_replicas(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+
+    assert stop_namespace("team-a") == {"scaled": 3}
+    assert set(cluster.replicas("team-a").values()) == {0}
+    assert saved_counts("team-a") == {"deployment/web": 3, "deployment/api": 2, "statefulset/db": 1}
+
+    assert start_namespace("team-a") == {"restored": 3, "not_ready": []}
+    assert cluster.replicas("team-a") == WORKLOADS
+    assert saved_counts("team-a") == {}
+
+
+def test_second_stop_keeps_the_saved_counts(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+    stop_namespace("team-a")
+
+    assert stop_namespace("team-a") == {"scaled": 0}
+    assert saved_counts("team-a") == {"deployment/web": 3, "deployment/api": 2, "statefulset/db": 1}
+
+    start_namespace("team-a")
+    assert cluster.replicas("team-a") == WORKLOADS
+
+
+def test_stop_after_manual_scale_up_remembers_the_new_count(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+    stop_namespace("team-a")
+    cluster.set_replicas("team-a", "deployment/web", 5)
+
+    assert stop_namespace("team-a") == {"scaled": 1}
+    start_namespace("team-a")
+    assert cluster.replicas("team-a")["deployment/web"] == 5
+    assert cluster.replicas("team-a")["deployment/api"] == 2
+
+
+def test_partial_scale_failure_keeps_counts_for_a_retry(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+    stop_namespace("team-a")
+    # deployment/api is alone in its replica group, so only that call fails
+    cluster.fail("--replicas=2 deployment/api")
+
+    with pytest.raises(KubectlError):
+        start_namespace("team-a")
+    assert cluster.replicas("team-a")["deployment/web"] == 3
+    assert cluster.replicas("team-a")["deployment/api"] == 0
+    assert saved_counts("team-a") == {"deployment/web": 3, "deployment/api": 2, "statefulset/db": 1}
+
+    cluster.heal()
+    assert start_namespace("team-a")["restored"] == 3
+    assert cluster.replicas("team-a") == WORKLOADS
+    assert saved_counts("team-a") == {}
+
+
+def test_failed_stop_saves_counts_before_scaling(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+    cluster.fail("scale -n team-a --replicas=0")
+
+    with pytest.raises(KubectlError):
+        stop_namespace("team-a")
+    assert cluster.replicas("team-a") == WORKLOADS
+    assert saved_counts("team-a") == {"deployment/web": 3, "deployment/api": 2, "statefulset/db": 1}
+
+
+def test_readiness_wait_reports_workloads_that_time_out(app, cluster):
+    cluster.add_namespace("team-a", WORKLOADS)
+    stop_namespace("team-a")
+    cluster.never_ready("statefulset/db")
+
+    started = time.monotonic()
+    result = start_namespace("team-a", wait=True, timeout=1)
+    assert time.monotonic() - started < 10
+
+    assert result == {"restored": 3, "not_ready": ["statefulset/db"]}
+    assert any(call.startswith("rollout status deployment/web") for call in cluster.calls)
+
+
+def test_blacklisted_namespace_is_never_scaled(app, cluster, client):
+    cluster.add_namespace("kube-system", {"deployment/coredns": 2})
+
+    with pytest.raises(BlacklistedNamespaceError):
+        stop_namespace("kube-system")
+    assert client.post("/api/namespace/kube-system/stop").status_code == 403
+    assert client.post("/api/namespace/kube-system/start").status_code == 403
+
+    assert cluster.replicas("kube-system") == {"deployment/coredns": 2}
+    assert not any(call.startswith("scale") for call in cluster.calls)
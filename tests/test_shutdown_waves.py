@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+from extensions import db
+from models import ShutdownWave
+from shutdown_utils import mark_interrupted_waves
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def shutdown_settings(**env):
+    """Import shutdown_utils in a fresh interpreter with `env` and return its limits."""
+    result = subprocess.run(
+        [sys.executable, "-c", "import shutdown_utils as s; "
+                               "print(s.SHUTDOWN_RATE, s.SHUTDOWN_BURST, s.SHUTDOWN_MAX_IN_FLIGHT)"],
+        cwd=ROOT, env={**os.environ, **env}, capture_output=True, text=True, check=True
+    )
+    rate, burst, max_in_flight = result.stdout.split()
+    return float(rate), int(burst), int(max_in_flight)
+
+
+def test_invalid_shutdown_limits_fall_back_to_the_defaults():
+    assert shutdown_settings(AGNOSTER_SHUTDOWN_RATE="0", AGNOSTER_SHUTDOWN_BURST="0",
+                             AGNOSTER_SHUTDOWN_MAX_IN_FLIGHT="0") == (1.0, 5, 4)
+    assert shutdown_settings(AGNOSTER_SHUTDOWN_RATE="-2") == (1.0, 5, 4)
+    assert shutdown_settings(AGNOSTER_SHUTDOWN_RATE="0.5", AGNOSTER_SHUTDOWN_BURST="2",
+                             AGNOSTER_SHUTDOWN_MAX_IN_FLIGHT="8") == (0.5, 2, 8)
+
+
+def test_leftover_running_waves_are_marked_interrupted(app):
+    db.session.add_all([
+        ShutdownWave(total=3, completed=1),
+        ShutdownWave(total=2, completed=2, status="finished"),
+    ])
+    db.session.commit()
+
+    assert mark_interrupted_waves() == 1
+    assert [wave.status for wave in ShutdownWave.query.order_by(ShutdownWave.id)] == ["interrupted", "finished"]
+    assert mark_interrupted_waves() == 0
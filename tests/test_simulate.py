@@ -0,0 +1,68 @@
+import random
+import time
+
+import pytest
+
+from kubernetes_utils import simulate_thresholds, simulated_shutdowns
+
+
+def pod_hours_saved(runtimes_by_namespace, threshold):
+    """The shutdown rule spelled out pod by pod."""
+    saved = 0.0
+    for runtimes in runtimes_by_namespace.values():
+        if not runtimes:
+            continue
+        longest = max(runtimes)
+        if longest > threshold:
+            saved += sum(min(runtime, longest - threshold) for runtime in runtimes)
+    return round(saved, 2)
+
+
+def test_simulation_matches_the_rule_pod_by_pod():
+    rng = random.Random(7)
+    runtimes = {f"ns-{i}": [round(rng.uniform(0, 48), 2) for _ in range(rng.randint(1, 8))] for i in range(200)}
+    runtimes["empty"] = []
+    thresholds = [-1, 0, 0.5, 6, 13.25, 24, 47.9, 48, 100]
+
+    results = simulate_thresholds(runtimes, thresholds)
+
+    assert [result["threshold"] for result in results] == thresholds
+    for result in results:
+        threshold = result["threshold"]
+        assert result["pod_hours_saved"] == pytest.approx(pod_hours_saved(runtimes, threshold), abs=0.02)
+        assert result["namespace_count"] == len(simulated_shutdowns(runtimes, threshold))
+        assert "namespaces" not in result
+
+
+def test_simulated_shutdowns_lists_longest_running_first():
+    runtimes = {"a": [3, 20], "b": [15], "c": [2], "d": []}
+    assert simulated_shutdowns(runtimes, 14) == ["a", "b"]
+    assert simulated_shutdowns(runtimes, 15) == ["a"]
+    assert simulated_shutdowns(runtimes, 20) == []
+
+
+def test_large_sweeps_stay_fast():
+    rng = random.Random(1)
+    runtimes = {f"ns-{i}": [rng.uniform(0, 72) for _ in range(2)] for i in range(50000)}
+
+    started = time.monotonic()
+    results = simulate_thresholds(runtimes, [i * 0.5 for i in range(100)])
+    assert time.monotonic() - started < 2
+    assert results[0]["namespace_count"] == 50000
+
+
+def test_simulate_api_lists_namespaces_for_one_threshold(client, cluster):
+    cluster.add_namespace("team-a", pods=[("web", "2020-01-01T00:00:00Z")])
+    cluster.add_namespace("team-b", pods=[("web", "2999-01-01T00:00:00Z")])
+
+    response = client.post("/api/simulate", json={"range": {"start": 1, "stop": 10}})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body["results"]) == 10
+    assert all(set(result) == {"threshold", "namespace_count", "pod_hours_saved"} for result in body["results"])
+    assert body["namespaces_at"] == body["current_threshold"]
+    assert body["namespaces"] == ["team-a"]
+
+    response = client.post("/api/simulate", json={"thresholds": [1], "namespaces_at": 10 ** 9})
+    assert response.get_json()["namespaces"] == []
+    assert client.post("/api/simulate", json={"thresholds": [1], "namespaces_at": "soon"}).status_code == 400
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Which signal the monitor stops namespaces on:
+#   runtime           - a pod ran longer than the shutdown threshold (default)
+#   idle              - the namespace was idle for idle_hours
+#   runtime_and_idle  - both of the above
+# The policy and idle hours live on Config; these seed it (see init_db)
+SHUTDOWN_POLICIES = ("runtime", "idle", "runtime_and_idle")
+SHUTDOWN_POLICY = os.environ.get("AGNOSTER_SHUTDOWN_POLICY", "runtime")
+IDLE_HOURS = float(os.environ.get("AGNOSTER_IDLE_HOURS", "2"))
+# A namespace is idle while all its pods together stay at or below both limits
+IDLE_CPU_MILLICORES = float(os.environ.get("AGNOSTER_IDLE_CPU_MILLICORES", "50"))
+IDLE_MEMORY_MIB = float(os.environ.get("AGNOSTER_IDLE_MEMORY_MIB", "256"))
+
+if SHUTDOWN_POLICY not in SHUTDOWN_POLICIES:
+    logger.warning(f"Unknown AGNOSTER_SHUTDOWN_POLICY {SHUTDOWN_POLICY!r}, using 'runtime'")
+    SHUTDOWN_POLICY = "runtime"
+
+CPU_UNITS = {"n": 1e-6, "u": 1e-3, "m": 1, "": 1000}  # -> millicores
+MEMORY_UNITS = {  # -> MiB
+    "Ki": 1 / 1024, "Mi": 1, "Gi": 1024, "Ti": 1024 ** 2,
+    "k": 1e3 / 2 ** 20, "M": 1e6 / 2 ** 20, "G": 1e9 / 2 ** 20, "T": 1e12 / 2 ** 20,
+    "": 1 / 2 ** 20,
+}
+
+
+def shutdown_policy(config):
+    """Return the (policy, idle_hours) in effect for a Config row, or the defaults."""
+    if config is None:
+        return SHUTDOWN_POLICY, IDLE_HOURS
+    policy = config.shutdown_policy if config.shutdown_policy in SHUTDOWN_POLICIES else SHUTDOWN_POLICY
+    idle_hours = config.idle_hours if config.idle_hours is not None else IDLE_HOURS
+    return policy, idle_hours
+
+
+def _parse_quantity(value, units):
+    value = str(value)
+    for suffix in sorted(units, key=len, reverse=True):
+        if suffix and value.endswith(suffix):
+            return float(value[:-len(suffix)]) * units[suffix]
+    return float(value) * units[""]
+
+
+def parse_cpu(value):
+    """Convert a Kubernetes CPU quantity ("250m", "1", "120000n") to millicores."""
+    return _parse_quantity(value, CPU_UNITS)
+
+
+def parse_memory(value):
+    """Convert a Kubernetes memory quantity ("128Mi", "1Gi", "52000Ki") to MiB."""
+    return _parse_quantity(value, MEMORY_UNITS)
+
+
+class UsageWindow:
+    """Rolling in-memory window of per-namespace CPU and memory usage.
+
+    Each monitor tick adds one sample per namespace. Alongside the samples the
+    window tracks when each namespace last turned idle, so asking how long it
+    has been idle is a dictionary lookup rather than a scan of its history.
+    Namespaces missing from a sample (no running pods) are forgotten, so their
+    idle clock starts over once they come back.
+    """
+
+    def __init__(self, window_hours, cpu_millicores, memory_mib):
+        self.window = window_hours * 3600
+        self.cpu_millicores = cpu_millicores
+        self.memory_mib = memory_mib
+        self._samples = {}  # namespace -> deque of (timestamp, cpu_millicores, memory_mib)
+        self._idle_since = {}  # namespace -> timestamp of the first idle sample in the current idle run
+        self._lock = threading.Lock()
+
+    def resize(self, window_hours):
+        """Change how far back samples are kept, e.g. after idle hours were reconfigured."""
+        self.window = window_hours * 3600
+
+    def is_idle(self, cpu, memory):
+        return cpu <= self.cpu_millicores and memory <= self.memory_mib
+
+    def record(self, usage, now=None):
+        """Add one sample: usage maps namespace -> {"cpu_millicores", "memory_mib"}."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            for namespace in set(self._samples) - set(usage):
+                del self._samples[namespace]
+                self._idle_since.pop(namespace, None)
+
+            for namespace, sample in usage.items():
+                samples = self._samples.setdefault(namespace, deque())
+                samples.append((now, sample["cpu_millicores"], sample["memory_mib"]))
+                while samples[0][0] < now - self.window:
+                    samples.popleft()
+
+                if self.is_idle(sample["cpu_millicores"], sample["memory_mib"]):
+                    self._idle_since.setdefault(namespace, now)
+                else:
+                    self._idle_since.pop(namespace, None)
+
+    def idle_hours(self, namespace, now=None):
+        """Hours a namespace has been continuously idle, 0 if busy or unknown."""
+        now = now if now is not None else time.time()
+        idle_since = self._idle_since.get(namespace)
+        if idle_since is None:
+            return 0
+        return (now - idle_since) / 3600
+
+    def idle_for(self, namespace, hours, now=None):
+        """Whether a namespace is idle now and has been for at least `hours`."""
+        return namespace in self._idle_since and self.idle_hours(namespace, now) >= hours
+
+    def averages(self, namespace):
+        """Average CPU (millicores) and memory (MiB) over the window, or None."""
+        with self._lock:
+            samples = list(self._samples.get(namespace, ()))
+        if not samples:
+            return None
+        return {
+            "cpu_millicores": round(sum(s[1] for s in samples) / len(samples), 1),
+            "memory_mib": round(sum(s[2] for s in samples) / len(samples), 1),
+        }
+
+
+# Keep a little more than the idle period so averages cover all of it
+usage_window = UsageWindow(IDLE_HOURS * 1.5, IDLE_CPU_MILLICORES, IDLE_MEMORY_MIB)